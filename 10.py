@@ -1,55 +1,112 @@
 #!/usr/bin/env python3
 
+from array import array
+from bisect import bisect_right
+import mmap
 from sys import stderr, stdin
-from typing import Dict, Iterable, List, Tuple
+from typing import BinaryIO, List, Tuple, Union
 
 def d(*args, **kwargs):
     pass
     #print(file=stderr, *args, **kwargs
 
-class Direction(object):
-    def __init__(self, dx: int, dy: int):
-        self.dx = dx
-        self.dy = dy
-
-    def set_turn_mapping(self, mapping: Dict[str, 'Direction']):
-        self.turn_mapping = mapping
-
-    def __iter__(self) -> Iterable[int]:
-        yield self.dx
-        yield self.dy
-
-    def __repr__(self):
-        return f'Direction({self.dx}, {self.dy})'
+# Integer direction codes, in clockwise order so that the opposite of a
+# direction is two steps around
+NORTH, EAST, SOUTH, WEST = range(4)
+direction_steps = ((0, -1), (1, 0), (0, 1), (-1, 0))
+
+# The two directions each pipe connects
+pipe_connections = {
+    '|': (NORTH, SOUTH),
+    '-': (EAST, WEST),
+    'L': (NORTH, EAST),
+    'J': (NORTH, WEST),
+    '7': (SOUTH, WEST),
+    'F': (SOUTH, EAST),
+}
+
+# Transition table, indexed by ord(pipe) * 4 + heading on entering the pipe.
+# Each entry is the heading on leaving the pipe, or NO_EXIT if the pipe does
+# not connect to the side we entered from.
+NO_EXIT = 255
+transitions = bytearray([NO_EXIT]) * (256 * 4)
+for pipe, (a, b) in pipe_connections.items():
+    # Heading towards a means entering from its opposite side
+    transitions[ord(pipe) * 4 + (b + 2) % 4] = a
+    transitions[ord(pipe) * 4 + (a + 2) % 4] = b
+
+class MazeGrid(object):
+    '''
+    A read-only grid of cells laid out as lines of bytes, typically a memory
+    mapped input file.
+
+    Only the offset of each row is indexed up front. Cells are read straight
+    from the buffer, so only the pages actually visited are ever loaded.
+    '''
+    def __init__(self, buffer: Union[bytes, mmap.mmap]):
+        self.buffer = buffer
+        self.row_offsets = array('q')
+        pos = 0
+        while pos < len(buffer):
+            self.row_offsets.append(pos)
+            pos = buffer.find(b'\n', pos)
+            if pos == -1:
+                break
+            pos += 1
+        first_row = buffer[:buffer.find(b'\n')] if len(self.row_offsets) > 1 else buffer[:]
+        self.width = len(first_row.rstrip())
+        # Ignore any blank lines at the end of the input
+        while self.row_offsets and buffer[self.row_offsets[-1]:self.row_offsets[-1] + 1] in (b'', b'\n', b'\r'):
+            self.row_offsets.pop()
+        self.height = len(self.row_offsets)
+
+    @classmethod
+    def from_lines(cls, lines: List[str]) -> 'MazeGrid':
+        return cls('\n'.join(lines).encode())
+
+    @classmethod
+    def from_file(cls, f: BinaryIO) -> 'MazeGrid':
+        '''
+        Memory map the given file, falling back to reading it in full if it
+        can't be mapped (such as a pipe).
+        '''
+        try:
+            return cls(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+        except (OSError, ValueError):
+            return cls(f.read())
 
-north = Direction(0, -1)
-south = Direction(0, 1)
-east = Direction(1, 0)
-west = Direction(-1, 0)
+    def cell(self, x: int, y: int) -> int:
+        '''
+        Return the byte value of the cell at x, y.
+        '''
+        return self.buffer[self.row_offsets[y] + x]
 
-north.set_turn_mapping({'|': north, 'F': east, '7': west})
-south.set_turn_mapping({'|': south, 'L': east, 'J': west})
-east.set_turn_mapping({'-': east, '7': south, 'J': north})
-west.set_turn_mapping({'-': west, 'F': south, 'L': north})
+    def find(self, label: bytes) -> Tuple[int, int]:
+        '''
+        Return the coordinates of the first cell with the given label.
+        '''
+        pos = self.buffer.find(label)
+        if pos == -1:
+            raise ValueError(f'No cell labelled {label}')
+        y = bisect_right(self.row_offsets, pos) - 1
+        return (pos - self.row_offsets[y], y)
 
 class Maze(object):
-    def __init__(self, input_data: List[str]):
+    def __init__(self, grid: MazeGrid):
         '''
         Straight pipes are labelled - and |, corners are labelled F 7 L and J.
 
         Empty spaces are labelled ., and the start is labelled S.
         '''
-        self.cells = input_data
+        self.grid = grid
 
     def find_source(self) -> Tuple[int, int]:
         '''
         Find the cell labelled "S"
         '''
-        for y, row in enumerate(self.cells):
-            for x, cell in enumerate(row):
-                if cell == 'S':
-                    d(f'Found source at {x}, {y}')
-                    return (x, y)
+        source = self.grid.find(b'S')
+        d(f'Found source at {source}')
+        return source
     
     def find_main_loop(self, start: Tuple[int, int]):
         '''
@@ -57,15 +114,14 @@ class Maze(object):
         part of the same connected component. Return the total length of the
         loop this forms.
         '''
-        w, h = len(self.cells[0]), len(self.cells)
-        # Iterate through the four cardinally adjacent cells, tracing a path
-        for dir in (north, south, east, west):
-            # Calculate the location of the adjacent cell
+        grid = self.grid
+        w, h = grid.width, grid.height
+        # Trace a path out of each of the four cardinally adjacent cells
+        for heading in range(4):
             distance = 0
             x, y = start
             while True:
-                d(f'Checking {x}, {y} going {dir}')
-                dx, dy = dir
+                dx, dy = direction_steps[heading]
                 x += dx
                 y += dy
                 # If it's out of bounds, end this trace
@@ -75,14 +131,9 @@ class Maze(object):
                 # If we found the start, we're done
                 if (x, y) == start:
                     return distance
-                cell = self.cells[y][x]
-                # If it's empty, end this trace
-                if cell == '.':
-                    break
-                # Otherwise, work out which direction we're turning next
-                try:
-                    dir = dir.turn_mapping[cell]
-                except KeyError:
+                # Otherwise, work out which heading we leave this cell on
+                heading = transitions[grid.cell(x, y) * 4 + heading]
+                if heading == NO_EXIT:
                     # Not connected to us, end this trace
                     break
         raise ValueError('No loop found')
@@ -91,8 +142,7 @@ class Maze(object):
 
 
 
-input_data = list(line.rstrip() for line in stdin)
-data = Maze(input_data)
+data = Maze(MazeGrid.from_file(stdin.buffer))
 
 # Print out the distance to the furtherest element in the cycle
 print(data.find_main_loop(data.find_source()) // 2)
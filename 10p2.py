@@ -1,129 +1,331 @@
 #!/usr/bin/env python3
 
-from sys import stderr, stdin
-from typing import Dict, Iterable, List, Tuple
+from array import array
+from bisect import bisect_right
+import mmap
+from sys import argv, stderr, stdin
+from typing import BinaryIO, Iterable, List, Optional, Tuple, Union
 
 def d(*args, **kwargs):
     pass
     #print(file=stderr, *args, **kwargs
 
-class Direction(object):
-    def __init__(self, dx: int, dy: int, straight_repr: str):
-        self.dx = dx
-        self.dy = dy
-        self.straight_repr = straight_repr
+# Integer direction codes, in clockwise order so that the opposite of a
+# direction is two steps around
+NORTH, EAST, SOUTH, WEST = range(4)
+direction_steps = ((0, -1), (1, 0), (0, 1), (-1, 0))
 
-    def set_turn_mapping(self, mapping: Dict[str, 'Direction']):
-        self.turn_mapping = mapping
+# The two directions each pipe connects
+pipe_connections = {
+    '|': (NORTH, SOUTH),
+    '-': (EAST, WEST),
+    'L': (NORTH, EAST),
+    'J': (NORTH, WEST),
+    '7': (SOUTH, WEST),
+    'F': (SOUTH, EAST),
+}
+pipe_from_connections = {frozenset(v): k for k, v in pipe_connections.items()}
+pipe_connection_bytes = frozenset(ord(pipe) for pipe in pipe_connections)
 
-    def set_opposite(self, opposite: 'Direction'):
-        self.opposite = opposite
-        opposite.opposite = self
+# Transition table, indexed by ord(pipe) * 4 + heading on entering the pipe.
+# Each entry is the heading on leaving the pipe, or NO_EXIT if the pipe does
+# not connect to the side we entered from.
+NO_EXIT = 255
+transitions = bytearray([NO_EXIT]) * (256 * 4)
+bends = frozenset(ord(pipe) for pipe in 'LJ7F')
+# Whether a cell connects in a given direction, indexed by
+# ord(pipe) * 4 + direction
+connects = bytearray(256 * 4)
+for pipe, (a, b) in pipe_connections.items():
+    # Heading towards a means entering from its opposite side
+    transitions[ord(pipe) * 4 + (b + 2) % 4] = a
+    transitions[ord(pipe) * 4 + (a + 2) % 4] = b
+    connects[ord(pipe) * 4 + a] = connects[ord(pipe) * 4 + b] = 1
 
-    def __iter__(self) -> Iterable[int]:
-        yield self.dx
-        yield self.dy
+class PipeNetwork(object):
+    '''
+    A connected set of pipes, which is either a closed loop or an open path.
+
+    Only closed networks enclose any cells.
+    '''
+    def __init__(self, size: int, closed: bool, enclosed: int):
+        self.size = size
+        self.closed = closed
+        self.enclosed = enclosed
 
     def __repr__(self):
-        return f'Direction({self.dx}, {self.dy}, "{self.straight_repr}")'
+        return f'PipeNetwork({self.size}, {self.closed}, {self.enclosed})'
 
-north = Direction(0, -1, '|')
-south = Direction(0, 1, '|')
-east = Direction(1, 0, '-')
-west = Direction(-1, 0, '-')
+class MazeGrid(object):
+    '''
+    A read-only grid of cells laid out as lines of bytes, typically a memory
+    mapped input file.
 
-north.set_turn_mapping({'|': north, 'F': east, '7': west})
-south.set_turn_mapping({'|': south, 'L': east, 'J': west})
-east.set_turn_mapping({'-': east, '7': south, 'J': north})
-west.set_turn_mapping({'-': west, 'F': south, 'L': north})
+    Only the offset of each row is indexed up front. Cells are read straight
+    from the buffer, so only the pages actually visited are ever loaded.
+    '''
+    def __init__(self, buffer: Union[bytes, mmap.mmap]):
+        self.buffer = buffer
+        self.row_offsets = array('q')
+        pos = 0
+        while pos < len(buffer):
+            self.row_offsets.append(pos)
+            pos = buffer.find(b'\n', pos)
+            if pos == -1:
+                break
+            pos += 1
+        first_row = buffer[:buffer.find(b'\n')] if len(self.row_offsets) > 1 else buffer[:]
+        self.width = len(first_row.rstrip())
+        # Ignore any blank lines at the end of the input
+        while self.row_offsets and buffer[self.row_offsets[-1]:self.row_offsets[-1] + 1] in (b'', b'\n', b'\r'):
+            self.row_offsets.pop()
+        self.height = len(self.row_offsets)
 
-north.set_opposite(south)
-east.set_opposite(west)
+    @classmethod
+    def from_lines(cls, lines: List[str]) -> 'MazeGrid':
+        return cls('\n'.join(lines).encode())
 
-def cell_from_direcctions(d1, d2) -> str:
-    '''
-    Return a cell connected to two provided directions.
-    '''
-    if d1 == d2:
-        return d1.straight_repr
-    bend = set((d1, d2))
-    if bend == set((north, east)):
-        return 'L'
-    elif bend == set((north, west)):
-        return 'J'
-    elif bend == set((south, east)):
-        return 'F'
-    elif bend == set((south, west)):
-        return '7'
-    else:
-        raise ValueError(f'Unknown directions {d1}, {d2}')
+    @classmethod
+    def from_file(cls, f: BinaryIO) -> 'MazeGrid':
+        '''
+        Memory map the given file, falling back to reading it in full if it
+        can't be mapped (such as a pipe).
+        '''
+        try:
+            return cls(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+        except (OSError, ValueError):
+            return cls(f.read())
+
+    def cell(self, x: int, y: int) -> int:
+        '''
+        Return the byte value of the cell at x, y.
+        '''
+        return self.buffer[self.row_offsets[y] + x]
+
+    def find(self, label: bytes) -> Tuple[int, int]:
+        '''
+        Return the coordinates of the first cell with the given label.
+        '''
+        pos = self.buffer.find(label)
+        if pos == -1:
+            raise ValueError(f'No cell labelled {label}')
+        y = bisect_right(self.row_offsets, pos) - 1
+        return (pos - self.row_offsets[y], y)
 
 class Maze(object):
-    def __init__(self, input_data: List[str]):
+    def __init__(self, grid: MazeGrid):
         '''
         Straight pipes are labelled - and |, corners are labelled F 7 L and J.
 
         Empty spaces are labelled ., and the start is labelled S.
         '''
-        self.cells = input_data
+        self.grid = grid
 
     def find_source(self) -> Tuple[int, int]:
         '''
         Find the cell labelled "S"
         '''
-        for y, row in enumerate(self.cells):
-            for x, cell in enumerate(row):
-                if cell == 'S':
-                    d(f'Found source at {x}, {y}')
-                    self.source = (x, y)
-                    return self.source
+        self.source = self.grid.find(b'S')
+        d(f'Found source at {self.source}')
+        return self.source
+
+    def on_loop(self, x: int, y: int) -> bool:
+        i = y * self.width + x
+        return bool(self.loop_bits[i >> 3] & 1 << (i & 7))
+
+    def find_source_pipe(self) -> str:
+        '''
+        Work out which pipe the source must be, by tracing the loop through
+        it.
+        '''
+        self.find_main_loop()
+        return self.source_pipe
 
     def find_main_loop(self) -> int:
         '''
-        From a specified starting location, find two adjacent cells that are
-        part of the same connected component. Return the total length of the
-        loop this forms.
-        '''
-        w, h = len(self.cells[0]), len(self.cells)
-        # Iterate through the four cardinally adjacent cells, tracing a path
-        for sdir in (north, south, east, west):
-            dir = sdir
-            # Calculate the location of the adjacent cell
-            distance = 0
-            x, y = self.source
-            self.loop_cells = [[' ' for _ in range(w)] for _ in range(h)]
-            while True:
-                d(f'Checking {x}, {y} going {dir}')
-                dx, dy = dir
-                x += dx
-                y += dy
-                # If it's out of bounds, end this trace
-                if not (0 <= x < w and 0 <= y < h):
-                    break
-                distance += 1
-                cell = self.cells[y][x]
-                # If it's empty, end this trace
-                if cell == '.':
-                    break
-                # If we found the start, first replace it with a standard pipe
-                # label based on its directions
-                if (x, y) == self.source:
-                    d(f'Left start going {sdir}, arrived back at start going {dir}', file=stderr)
-                    cell = cell_from_direcctions(sdir, dir.opposite)
-                self.loop_cells[y][x] = cell
-                # If we found the start, we're done
-                if (x, y) == self.source:
-                    return distance
-                # Otherwise, work out which direction we're turning next
-                try:
-                    dir = dir.turn_mapping[cell]
-                except KeyError:
-                    # Not connected to us, end this trace
-                    break
+        Trace the loop through the source, and return its total length.
+
+        Each heading out of the source whose neighbour connects back to it
+        is traced in turn, until one leads back to the source. The heading it
+        arrives back on gives the source's pipe, so pipes outside the loop
+        which happen to point at the source are skipped over. Membership of
+        the loop is recorded in a single bitset over the grid, allocated
+        once; a trace that fails is walked again to clear its bits.
+
+        The bends in the loop are also collected in order, as the vertices of
+        the polygon it traces.
+        '''
+        grid = self.grid
+        w, h = grid.width, grid.height
+        self.width, self.height = w, h
+        self.loop_bits = bytearray((w * h + 7) // 8)
+        sx, sy = self.source
+        for heading, (dx, dy) in enumerate(direction_steps):
+            x, y = sx + dx, sy + dy
+            if not (0 <= x < w and 0 <= y < h) or transitions[grid.cell(x, y) * 4 + heading] == NO_EXIT:
+                continue
+            self.corners = []
+            arrival = self.trace_loop(heading)
+            if arrival is None:
+                # Clear the bits set by the failed trace
+                self.trace_loop(heading)
+                continue
+            self.source_pipe = pipe_from_connections[frozenset((heading, (arrival + 2) % 4))]
+            if ord(self.source_pipe) in bends:
+                self.corners.insert(0, self.source)
+            return self.loop_length
         raise ValueError('No loop found')
 
+    def trace_loop(self, heading: int) -> Optional[int]:
+        '''
+        Follow the pipes leaving the source on the given heading, toggling
+        the bits of the cells visited in loop_bits and recording the bends in
+        corners.
+
+        Return the heading on which we arrive back at the source, or None if
+        the pipes lead to a dead end or off the grid. Since pipes never
+        branch, a path from the source can't visit any cell twice, so tracing
+        the same heading again toggles every bit back.
+        '''
+        grid = self.grid
+        w, h = grid.width, grid.height
+        x, y = self.source
+        distance = 0
+        while True:
+            dx, dy = direction_steps[heading]
+            x += dx
+            y += dy
+            # If it's out of bounds, end this trace
+            if not (0 <= x < w and 0 <= y < h):
+                return None
+            distance += 1
+            i = y * w + x
+            self.loop_bits[i >> 3] ^= 1 << (i & 7)
+            # If we found the start, we're done
+            if (x, y) == self.source:
+                self.loop_length = distance
+                return heading
+            cell = grid.cell(x, y)
+            if cell in bends:
+                self.corners.append((x, y))
+            heading = transitions[cell * 4 + heading]
+            if heading == NO_EXIT:
+                # Not connected to us, end this trace
+                return None
+
+    def find_pipe_networks(self) -> List[PipeNetwork]:
+        '''
+        Find every connected network of pipes in the grid, including those
+        not connected to the source.
+
+        A single pass over the grid joins each cell to its east and south
+        neighbours with union-find, wherever the two connect to each other.
+        Since no pipe has more than two connections, a network is closed
+        exactly when some join finds both cells already connected.
+
+        The vertical joins are recorded in row-major order as we go. The
+        area of each closed loop's polygon is then the total length of the
+        spans between alternate vertical joins in each row, and Pick's
+        theorem gives the number of enclosed cells, as in
+        count_contained_cells.
+
+        We must have previously found the main loop.
+        '''
+        grid = self.grid
+        w, h = grid.width, grid.height
+        source_pipe = ord(self.source_pipe)
+        parent = array('l', range(w * h))
+        size = array('l', [1]) * (w * h)
+        cyclic = set()
+
+        def find(i):
+            while parent[i] != i:
+                # Path halving
+                parent[i] = parent[parent[i]]
+                i = parent[i]
+            return i
+
+        def union(i, j):
+            i, j = find(i), find(j)
+            if i == j:
+                cyclic.add(i)
+                return
+            if size[i] < size[j]:
+                i, j = j, i
+            parent[j] = i
+            size[i] += size[j]
+            if j in cyclic:
+                cyclic.add(i)
+
+        # Vertical joins as (row below, x, cell index)
+        vertical_joins = []
+        pipes = []
+        for y in range(h):
+            for x in range(w):
+                cell = grid.cell(x, y)
+                if cell == ord('S'):
+                    cell = source_pipe
+                if cell not in pipe_connection_bytes:
+                    continue
+                i = y * w + x
+                pipes.append(i)
+                if x + 1 < w and connects[cell * 4 + EAST]:
+                    east = grid.cell(x + 1, y)
+                    if east == ord('S'):
+                        east = source_pipe
+                    if connects[east * 4 + WEST]:
+                        union(i, i + 1)
+                if y + 1 < h and connects[cell * 4 + SOUTH]:
+                    south = grid.cell(x, y + 1)
+                    if south == ord('S'):
+                        south = source_pipe
+                    if connects[south * 4 + NORTH]:
+                        union(i, i + w)
+                        vertical_joins.append((y + 1, x, i))
+
+        # Sum the cross-section of each closed loop between each pair of rows
+        areas = {root: 0 for root in map(find, cyclic)}
+        opened = {}
+        row = None
+        for y, x, i in vertical_joins:
+            if y != row:
+                row = y
+                opened.clear()
+            root = find(i)
+            if root not in areas:
+                continue
+            if root in opened:
+                areas[root] += x - opened.pop(root)
+            else:
+                opened[root] = x
+
+        networks = []
+        for root in set(map(find, pipes)):
+            if root in areas:
+                networks.append(PipeNetwork(size[root], True, areas[root] - size[root] // 2 + 1))
+            else:
+                networks.append(PipeNetwork(size[root], False, 0))
+        return networks
+
+    def loop_rows(self) -> Iterable[str]:
+        '''
+        Yield each row of the grid, showing only the pipes in the loop.
+        '''
+        for y in range(self.height):
+            row = []
+            for x in range(self.width):
+                if not self.on_loop(x, y):
+                    row.append(' ')
+                elif (x, y) == self.source:
+                    row.append(self.source_pipe)
+                else:
+                    row.append(chr(self.grid.cell(x, y)))
+            yield ''.join(row)
+
     def label_maze(self) -> Iterable[Iterable[str]]:
-        for y, row in enumerate(self.loop_cells):
+        if not hasattr(self, 'contained_cells'):
+            self.find_contained_cells()
+        for y, row in enumerate(self.loop_rows()):
             yield self.label_row(y, row)
 
     def label_row(self, y, row):
@@ -138,6 +340,23 @@ class Maze(object):
         Count the number of cells in the grid that are contained within the
         loop.
 
+        Treating the centre of each loop cell as a lattice point, the loop is
+        a polygon whose vertices are its bends. The shoelace formula gives its
+        area A, and Pick's theorem, A = i + b/2 - 1 with the b boundary points
+        being the loop cells, gives the i interior cells.
+
+        We must have previously found the main loop.
+        '''
+        twice_area = 0
+        for (x1, y1), (x2, y2) in zip(self.corners, self.corners[1:] + self.corners[:1]):
+            twice_area += x1 * y2 - x2 * y1
+        return (abs(twice_area) - self.loop_length) // 2 + 1
+
+    def find_contained_cells(self) -> int:
+        '''
+        Label each cell in the grid that is contained within the loop, and
+        return how many there are.
+
         We do this by casting a ray for each row, and counting each cell which
         is not itself part of the loop, and comes after an odd number of 
         vertical edges.
@@ -145,9 +364,9 @@ class Maze(object):
         We must have previously found the main loop.
         '''
         count = 0
-        w, h = len(self.cells[0]), len(self.cells)
+        w, h = self.width, self.height
         self.contained_cells = [[0 for _ in range(w)] for _ in range(h)]
-        for y, row in enumerate(self.loop_cells):
+        for y, row in enumerate(self.loop_rows()):
             # Count the number of cells in this row that are contained
             # within the loop
             in_loop = False
@@ -187,8 +406,7 @@ class Maze(object):
 
 
 
-input_data = list(line.rstrip() for line in stdin)
-data = Maze(input_data)
+data = Maze(MazeGrid.from_file(stdin.buffer))
 
 # Print out the distance to the furtherest element in the cycle
 data.find_source()
@@ -196,4 +414,9 @@ data.find_main_loop()
 
 print(data.count_contained_cells())
 
-d('\n'.join(''.join(r) for r in data.label_maze()), file=stderr)
+if len(argv) > 1 and argv[1] == '--networks':
+    for network in sorted(data.find_pipe_networks(), key=lambda n: -n.size):
+        print(network.size, 'closed' if network.closed else 'open', network.enclosed)
+
+if len(argv) > 1 and argv[1] == '--label':
+    print('\n'.join(''.join(r) for r in data.label_maze()), file=stderr)
@@ -10,25 +10,26 @@ def d(*args, **kwargs):
 class Grid(object):
     def __init__(self, input_data: List[str]):
         self.cells = input_data
-        # Find out which rows and columns are completely empty
-        empty_rows = [i for i, row in enumerate(self.cells) if all(c == '.' for c in row)]
-        empty_columns = [i for i in range(len(self.cells[0])) if all(row[i] == '.' for row in self.cells)]
+        # Count the galaxies in each row and column. Those with none are
+        # completely empty.
+        self.row_counts = [row.count('#') for row in self.cells]
+        self.column_counts = [column.count('#') for column in zip(*self.cells)]
         # Create a mapping from raw row/column to effective row/column number
         self.row_mapping = []
         row_offset = 0
-        for i in range(len(self.cells)):
-            if i in empty_rows:
+        for i, count in enumerate(self.row_counts):
+            if not count:
                 row_offset += 1
             self.row_mapping.append(i + row_offset)
         self.column_mapping = []
         column_offset = 0
-        for i in range(len(self.cells[0])):
-            if i in empty_columns:
+        for i, count in enumerate(self.column_counts):
+            if not count:
                 column_offset += 1
             self.column_mapping.append(i + column_offset)
         
-        self.effective_width = len(self.cells[0]) + len(empty_columns)
-        self.effective_height = len(self.cells) + len(empty_rows)
+        self.effective_width = len(self.cells[0]) + self.column_counts.count(0)
+        self.effective_height = len(self.cells) + self.row_counts.count(0)
     
     def find_galaxies(self):
         '''
@@ -54,9 +55,31 @@ class Grid(object):
                 # Find taxicab distance between these points
                 yield abs(galaxy[0] - other_galaxy[0]) + abs(galaxy[1] - other_galaxy[1])
 
+    def total_distance(self) -> int:
+        '''
+        Find the sum length of the complete graph, without visiting each
+        pair.
+
+        Taxicab distance separates into the two axes, and the sum of pairwise
+        distances along one axis is a walk over its lines in order: each
+        galaxy is further along than every galaxy seen so far, by its
+        position less each of theirs.
+        '''
+        def axis_total(counts: List[int], mapping: List[int]) -> int:
+            total = 0
+            seen = 0
+            seen_sum = 0
+            for count, position in zip(counts, mapping):
+                if count:
+                    total += count * (seen * position - seen_sum)
+                    seen += count
+                    seen_sum += count * position
+            return total
+        return axis_total(self.row_counts, self.row_mapping) + axis_total(self.column_counts, self.column_mapping)
+
 
 input_data = list(line.rstrip() for line in stdin)
 data = Grid(input_data)
 
 # Print out the sum of all the edge lengths
-print(sum(data.find_complete_graph_lengths()))
+print(data.total_distance())
@@ -1,35 +1,58 @@
 #!/usr/bin/env python3
 
-from sys import stderr, stdin
+from sys import argv, stderr, stdin
 from typing import Dict, Iterable, List, Tuple
 
 def d(*args, **kwargs):
     #pass
     print(file=stderr, *args, **kwargs)
 
+def empty_lines_passed(counts: List[int]) -> List[int]:
+    '''
+    For each line, return the number of empty lines up to and including it.
+    '''
+    passed = []
+    empty = 0
+    for count in counts:
+        if not count:
+            empty += 1
+        passed.append(empty)
+    return passed
+
+def axis_total(counts: List[int], mapping: List[int]) -> int:
+    '''
+    Find the sum of distances along one axis between every pair of
+    galaxies, given the number of galaxies on each line and each line's
+    position.
+
+    Walking the lines in order, each galaxy is further along than every
+    galaxy seen so far, by its position less each of theirs.
+    '''
+    total = 0
+    seen = 0
+    seen_sum = 0
+    for count, position in zip(counts, mapping):
+        if count:
+            total += count * (seen * position - seen_sum)
+            seen += count
+            seen_sum += count * position
+    return total
+
 class Grid(object):
-    def __init__(self, input_data: List[str]):
+    def __init__(self, input_data: List[str], empty_line_span: int = 1000000):
         self.cells = input_data
-        # Find out which rows and columns are completely empty
-        empty_rows = [i for i, row in enumerate(self.cells) if all(c == '.' for c in row)]
-        empty_columns = [i for i in range(len(self.cells[0])) if all(row[i] == '.' for row in self.cells)]
+        # Count the galaxies in each row and column. Those with none are
+        # completely empty.
+        self.row_counts = [row.count('#') for row in self.cells]
+        self.column_counts = [column.count('#') for column in zip(*self.cells)]
+        self.empty_rows_passed = empty_lines_passed(self.row_counts)
+        self.empty_columns_passed = empty_lines_passed(self.column_counts)
         # Create a mapping from raw row/column to effective row/column number
-        self.row_mapping = []
-        empty_line_span = 1000000
-        row_offset = 0
-        for i in range(len(self.cells)):
-            if i in empty_rows:
-                row_offset += empty_line_span - 1
-            self.row_mapping.append(i + row_offset)
-        self.column_mapping = []
-        column_offset = 0
-        for i in range(len(self.cells[0])):
-            if i in empty_columns:
-                column_offset += empty_line_span - 1
-            self.column_mapping.append(i + column_offset)
+        self.row_mapping = [i + e * (empty_line_span - 1) for i, e in enumerate(self.empty_rows_passed)]
+        self.column_mapping = [i + e * (empty_line_span - 1) for i, e in enumerate(self.empty_columns_passed)]
         
-        self.effective_width = len(self.cells[0]) + len(empty_columns)
-        self.effective_height = len(self.cells) + len(empty_rows)
+        self.effective_width = len(self.cells[0]) + self.column_counts.count(0)
+        self.effective_height = len(self.cells) + self.row_counts.count(0)
     
     def find_galaxies(self):
         '''
@@ -55,9 +78,142 @@ class Grid(object):
                 # Find taxicab distance between these points
                 yield abs(galaxy[0] - other_galaxy[0]) + abs(galaxy[1] - other_galaxy[1])
 
+    def total_distance(self) -> int:
+        '''
+        Find the sum length of the complete graph, without visiting each
+        pair.
+
+        Taxicab distance separates into the two axes, which are summed
+        independently.
+        '''
+        return axis_total(self.row_counts, self.row_mapping) + axis_total(self.column_counts, self.column_mapping)
+
+    def distance_coefficients(self) -> Tuple[int, int]:
+        '''
+        Return (base, crossings) such that the sum length of the complete
+        graph is base + (span - 1) * crossings for any empty line span.
+
+        Every position is its raw index plus (span - 1) times the number of
+        empty lines passed, and the axis totals are linear in position, so
+        these are the totals over raw indices and over empty lines passed.
+        '''
+        base = axis_total(self.row_counts, range(len(self.row_counts))) + \
+            axis_total(self.column_counts, range(len(self.column_counts)))
+        crossings = axis_total(self.row_counts, self.empty_rows_passed) + \
+            axis_total(self.column_counts, self.empty_columns_passed)
+        return base, crossings
+
+    def total_distances(self, spans: Iterable[int]) -> List[int]:
+        '''
+        Find the sum length of the complete graph for each empty line span.
+        '''
+        base, crossings = self.distance_coefficients()
+        return [base + (span - 1) * crossings for span in spans]
+
+
+class AxisTree(object):
+    '''
+    A segment tree over the lines of one axis, maintaining the sum of
+    pairwise distances along that axis between galaxies as they come and go.
+
+    Each line has a width: 1 if it holds a galaxy, or the empty line span if
+    not. A galaxy's position is the total width of the lines before it, so a
+    line becoming empty or occupied just changes that one line's width.
+
+    Each node holds, for its range of lines: the galaxy count, the total
+    width, the sum of galaxy positions relative to the start of the range,
+    and the sum of pairwise distances within the range. These combine
+    left-to-right, so each point update is O(log n).
+    '''
+    def __init__(self, counts: List[int], empty_line_span: int):
+        self.empty_line_span = empty_line_span
+        self.size = 1
+        while self.size < len(counts):
+            self.size *= 2
+        self.counts = [0] * (2 * self.size)
+        self.widths = [0] * (2 * self.size)
+        self.offsets = [0] * (2 * self.size)
+        self.totals = [0] * (2 * self.size)
+        for i, count in enumerate(counts):
+            self.counts[self.size + i] = count
+            self.widths[self.size + i] = 1 if count else empty_line_span
+        for node in reversed(range(1, self.size)):
+            self._combine(node)
+
+    def _combine(self, node: int):
+        l, r = 2 * node, 2 * node + 1
+        counts, widths, offsets, totals = self.counts, self.widths, self.offsets, self.totals
+        # Galaxies on the right are all shifted along by the left's width
+        right_offsets = offsets[r] + counts[r] * widths[l]
+        counts[node] = counts[l] + counts[r]
+        widths[node] = widths[l] + widths[r]
+        offsets[node] = offsets[l] + right_offsets
+        totals[node] = totals[l] + totals[r] + counts[l] * right_offsets - counts[r] * offsets[l]
+
+    def add(self, line: int, delta: int):
+        '''
+        Add delta galaxies to the given line.
+        '''
+        node = self.size + line
+        count = self.counts[node] + delta
+        if count < 0:
+            raise ValueError(f'No galaxy to remove on line {line}')
+        self.counts[node] = count
+        self.widths[node] = 1 if count else self.empty_line_span
+        node //= 2
+        while node:
+            self._combine(node)
+            node //= 2
+
+    def total(self) -> int:
+        return self.totals[1]
+
+class DynamicGalaxies(object):
+    '''
+    A set of galaxies that can be added and removed one at a time, keeping
+    the sum length of the complete graph up to date after each edit.
+    '''
+    def __init__(self, grid: Grid, empty_line_span: int = 1000000):
+        self.width = len(grid.column_counts)
+        self.height = len(grid.row_counts)
+        self.galaxies = set(
+            (x, y) for y, row in enumerate(grid.cells) for x, cell in enumerate(row) if cell == '#'
+        )
+        self.rows = AxisTree(grid.row_counts, empty_line_span)
+        self.columns = AxisTree(grid.column_counts, empty_line_span)
+
+    def insert(self, x: int, y: int) -> int:
+        '''
+        Add a galaxy, returning the new sum length of the complete graph.
+        '''
+        if not (0 <= x < self.width and 0 <= y < self.height):
+            raise ValueError(f'{x}, {y} is outside the grid')
+        if (x, y) in self.galaxies:
+            raise ValueError(f'There is already a galaxy at {x}, {y}')
+        self.galaxies.add((x, y))
+        self.rows.add(y, 1)
+        self.columns.add(x, 1)
+        return self.total()
+
+    def remove(self, x: int, y: int) -> int:
+        '''
+        Remove a galaxy, returning the new sum length of the complete graph.
+        '''
+        if (x, y) not in self.galaxies:
+            raise ValueError(f'There is no galaxy at {x}, {y}')
+        self.galaxies.remove((x, y))
+        self.rows.add(y, -1)
+        self.columns.add(x, -1)
+        return self.total()
+
+    def total(self) -> int:
+        return self.rows.total() + self.columns.total()
 
 input_data = list(line.rstrip() for line in stdin)
 data = Grid(input_data)
 
-# Print out the sum of all the edge lengths
-print(sum(data.find_complete_graph_lengths()))
+# Print out the sum of all the edge lengths, for each empty line span given
+# on the command line
+spans = [int(arg) for arg in argv[1:]] or [1000000]
+for total in data.total_distances(spans):
+    print(total)
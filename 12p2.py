@@ -1,9 +1,11 @@
 #!/usr/bin/env python3
 
-from collections import defaultdict
-from itertools import chain
+from argparse import ArgumentParser
+from collections import defaultdict, OrderedDict
+from itertools import accumulate, chain
+from multiprocessing import Pool
 from sys import argv, stderr, stdin
-from typing import Dict, Iterable, List, Tuple
+from typing import Dict, Iterable, List, Optional, Tuple
 
 from pyparsing import alphanums, delimitedList, Group, Keyword, White, Word, ZeroOrMore
 
@@ -18,15 +20,37 @@ def d(*args, **kwargs):
     #print(file=stderr, *args, **kwargs)
 
 class CachingPermuter(object):
-    def __init__(self, input_data: List[str]):
+    def __init__(self, input_data: List[str], line_cache_size: Optional[int] = None, shared_cache_size: int = 0, unfold: int = 5):
+        '''
+        Each line is unfolded into unfold copies of itself, joined by '?'.
+
+        Subproblems are cached per line, since keys are whole suffixes of a
+        line and rarely recur in other lines. The per-line cache is cleared
+        between lines, and if line_cache_size is given, holds at most that
+        many entries, evicting the least recently used.
+
+        If shared_cache_size is nonzero, a least recently used cache of that
+        size is also kept across lines, for subproblems that do recur.
+        '''
         results = document.parse_string(input_data, parse_all=True)
+        self.unfold = unfold
         self.lines = ((
             self.line_setup(r.springs),
-            tuple(int(v) for v in chain((0,), tuple(r.group_list) * 5))
+            self.group_setup(r.group_list)
         ) for r in results)
-        # Maintain a cache:
-        #  remaining line -> remaining groups required -> permutation_count
-        self.cache = defaultdict(dict)
+        # Maintain caches, in least to most recently used order:
+        #  (remaining line, remaining groups required) -> permutation_count
+        self.cache = OrderedDict()
+        self.line_cache_size = line_cache_size
+        self.shared_cache = OrderedDict()
+        self.shared_cache_size = shared_cache_size
+        self.cache_stats = {
+            'hits': 0,
+            'misses': 0,
+            'evictions': 0,
+            'shared_hits': 0,
+            'shared_evictions': 0,
+        }
 
     def line_setup(self, springs: str) -> str:
         '''
@@ -41,35 +65,86 @@ class CachingPermuter(object):
         Prepend a single preceding empty space to the start of the string, to
         indicate that we do not necessarily need to start a group immediately.
         '''
-        return '.' + '?'.join((springs,) * 5).strip('.')
+        return '.' + '?'.join((springs,) * self.unfold).strip('.')
+
+    def group_setup(self, group_list: Iterable[str]) -> Tuple[int, ...]:
+        '''
+        Transform an input group list into the unfolded groups, with a
+        leading 0 for the group before the start of the line.
+        '''
+        return tuple(int(v) for v in chain((0,), tuple(group_list) * self.unfold))
 
     def find_all_permutation_counts(self) -> Iterable[int]:
         '''
         Step through our list of input lines, and find all permutations.
         '''
         for springs, group_list in self.lines:
+            # Subproblems from previous lines are not worth keeping
+            self.cache.clear()
             # Find the number of permutations for this line
             result = self.find_permutation(springs, group_list)
             yield result
 
+    def find_all_permutation_counts_parallel(self, jobs: Optional[int] = None) -> Iterable[int]:
+        '''
+        Find all permutations with a pool of worker processes, each with its
+        own permuter configured like this one.
+
+        Lines are independent, so they are handed out one at a time, longest
+        first, so the slowest lines start early and the short ones fill in
+        around them. Counts are yielded as they complete, not in input order.
+        '''
+        lines = sorted(self.lines, key=lambda line: len(line[0]) * len(line[1]), reverse=True)
+        settings = (type(self), self.line_cache_size, self.shared_cache_size, self.unfold)
+        with Pool(jobs, initializer=start_worker, initargs=settings) as pool:
+            yield from pool.imap_unordered(count_line, lines, chunksize=1)
+
     def find_permutation(self, springs: str, group_list: Iterable[int], depth=0) -> int:
         '''
         Find the number of permutations for this line.
 
-        Keep track of subproblems we've already solved in self.cache.
+        Keep track of subproblems we've already solved in self.cache, and
+        self.shared_cache if enabled.
         '''
         # Normalize args: Strip off any preceding 0s
         group_list = tuple(int(v) for v in group_list)
+        key = (springs, group_list)
         # Cache hit: return the cached result
-        if group_list in self.cache[springs]:
-            result = self.cache[springs][group_list]
+        if key in self.cache:
+            self.cache.move_to_end(key)
+            self.cache_stats['hits'] += 1
+            result = self.cache[key]
             d(f'{" " * depth}Cache hit: "{springs}" {group_list} -> {result}')
             return result
+        if key in self.shared_cache:
+            self.shared_cache.move_to_end(key)
+            self.cache_stats['shared_hits'] += 1
+            result = self.shared_cache[key]
+            d(f'{" " * depth}Shared cache hit: "{springs}" {group_list} -> {result}')
+            self.remember(key, result)
+            return result
+        self.cache_stats['misses'] += 1
         result = self._find_permutation(springs, group_list, depth=depth)
         # Cache the result
-        self.cache[springs][group_list] = result
+        self.remember(key, result)
         return result
 
+    def remember(self, key: Tuple[str, Tuple[int, ...]], result: int):
+        '''
+        Cache a result, evicting the least recently used entries from any
+        cache over its budget.
+        '''
+        self.cache[key] = result
+        if self.line_cache_size is not None and len(self.cache) > self.line_cache_size:
+            self.cache.popitem(last=False)
+            self.cache_stats['evictions'] += 1
+        if self.shared_cache_size:
+            self.shared_cache[key] = result
+            self.shared_cache.move_to_end(key)
+            if len(self.shared_cache) > self.shared_cache_size:
+                self.shared_cache.popitem(last=False)
+                self.cache_stats['shared_evictions'] += 1
+
     def _find_permutation(self, state: str, group_list: List[int], depth=0) -> int:
         '''
         Find the number of permutations for this line.
@@ -114,33 +189,242 @@ class CachingPermuter(object):
         d(f'{" " * depth}{prev_char} <{head}>    "{tail}" into {group_list}: {result} total combinations')
         return result
 
+class DPPermuter(CachingPermuter):
+    '''
+    Count permutations with an iterative dynamic program over indices,
+    rather than recursing over string suffixes.
+
+    ways[j] after processing position i is the number of ways to fill
+    springs[i:] with groups[j:]. Positions are processed from the end of the
+    line backwards, keeping only the row for i + 1 and the row for the
+    position just past a group, so the work per line is
+    O(length * groups) with no string slicing or tuple rebuilding.
+    '''
+    def find_permutation(self, springs: str, group_list: Iterable[int], depth=0) -> int:
+        # Undo the normalisation done for the recursive permuter
+        springs = springs[1:]
+        groups = [v for v in group_list if v]
+        n, m = len(springs), len(groups)
+
+        # run[i] is the length of the run of possible springs starting at i,
+        # so a group of length k can start at i if run[i] >= k and the
+        # following cell is not a definite spring
+        run = [0] * (n + 1)
+        for i in reversed(range(n)):
+            run[i] = run[i + 1] + 1 if springs[i] != '.' else 0
+
+        # rows[i] is the ways row for position i, for positions still needed
+        # by a later group placement
+        rows = {n: [0] * m + [1]}
+        for i in reversed(range(n)):
+            after = rows[i + 1]
+            ways = [0] * (m + 1)
+            cell = springs[i]
+            if cell != '#':
+                ways[:] = after
+            if cell != '.':
+                for j in range(m):
+                    k = groups[j]
+                    end = i + k
+                    if run[i] >= k and (end == n or springs[end] != '#'):
+                        ways[j] += rows[min(end + 1, n)][j + 1]
+            rows[i] = ways
+            # Groups are never longer than the line, but rows more than the
+            # longest group plus one ahead are no longer needed
+            rows.pop(i + max(groups, default=0) + 2, None)
+        return rows[0][0]
+
+class BoundaryPermuter(CachingPermuter):
+    '''
+    Count permutations of an unfolded line one copy at a time, carrying only
+    the DP state at the '?' joints between copies, rather than solving the
+    whole unfolded line.
+
+    The state at a joint is (j, run): j groups are complete, and the current
+    run of springs has length run, or 0 if not in a group. Since the groups
+    repeat every len(groups), what a copy does to a state depends only on
+    j % len(groups) and run, so each copy's transitions are worked out once
+    per line and reused for every later copy.
+    '''
+    def line_setup(self, springs: str) -> str:
+        # Lines are unfolded by find_permutation
+        return springs
+
+    def group_setup(self, group_list: Iterable[str]) -> Tuple[int, ...]:
+        return tuple(int(v) for v in group_list)
+
+    def find_permutation(self, springs: str, group_list: Iterable[int], depth=0) -> int:
+        groups = tuple(group_list)
+        m = len(groups)
+        total = m * self.unfold
+        if not m:
+            return int('#' not in springs)
+
+        # Drop states whose remaining groups can no longer fit in the rest of
+        # the line, so the states carried stay close to the feasible band
+        group_sum = sum(groups)
+        prefix = list(chain((0,), accumulate(groups)))
+        def fits(j: int, run: int, remaining: int) -> bool:
+            cycles, offset = divmod(j, m)
+            left = total - j
+            springs_left = group_sum * (self.unfold - cycles) - prefix[offset]
+            return springs_left + left - 1 - run <= remaining
+
+        transitions = {}
+        def copy_transitions(unit: str, residue: int, run: int) -> Dict[Tuple[int, int], int]:
+            '''
+            Find the (groups completed, run) states reachable by passing
+            through unit, starting at a joint state with j % m == residue.
+            '''
+            key = (unit, residue, run)
+            if key not in transitions:
+                states = {(0, run): 1}
+                for cell in unit:
+                    next_states = defaultdict(int)
+                    for (completed, run), count in states.items():
+                        group = groups[(residue + completed) % m]
+                        if cell != '#':
+                            if not run:
+                                next_states[completed, 0] += count
+                            elif run == group:
+                                next_states[completed + 1, 0] += count
+                        if cell != '.' and run < group:
+                            next_states[completed, run + 1] += count
+                    states = next_states
+                transitions[key] = dict(states)
+            return transitions[key]
+
+        states = {(0, 0): 1}
+        unit = springs
+        for copy in range(self.unfold):
+            remaining = (self.unfold - copy - 1) * (len(springs) + 1)
+            next_states = defaultdict(int)
+            for (j, run), count in states.items():
+                for (completed, next_run), ways in copy_transitions(unit, j % m, run).items():
+                    next_j = j + completed
+                    if next_j <= total and fits(next_j, next_run, remaining):
+                        next_states[next_j, next_run] += count * ways
+            states = next_states
+            unit = '?' + springs
+
+        # A run still open at the end of the line must close the last group
+        last = groups[(total - 1) % m]
+        return states.get((total, 0), 0) + states.get((total - 1, last), 0)
+
+# The recursive permuter recurses once per cell of the unfolded line, so
+# beyond this many copies, lines risk exceeding the recursion limit
+RECURSIVE_UNFOLD_LIMIT = 10
+
+worker_permuter = None
+
+def start_worker(permuter: type, line_cache_size: Optional[int], shared_cache_size: int, unfold: int):
+    '''
+    Set up the permuter used by this worker process.
+    '''
+    global worker_permuter
+    worker_permuter = permuter('', line_cache_size=line_cache_size, shared_cache_size=shared_cache_size, unfold=unfold)
+
+def count_line(line: Tuple[str, Tuple[int, ...]]) -> int:
+    '''
+    Count the permutations of one set-up line in a worker process.
+    '''
+    springs, group_list = line
+    worker_permuter.cache.clear()
+    return worker_permuter.find_permutation(springs, group_list)
+
 def main():
+    parser = ArgumentParser()
+    parser.add_argument('--dp', action='store_true', help='count with the index-based DP engine')
+    parser.add_argument('--boundary', action='store_true', help='count one unfolded copy at a time')
+    parser.add_argument('--unfold', type=int, default=5,
+        help=f'number of copies each line unfolds into; above {RECURSIVE_UNFOLD_LIMIT}, '
+             'lines are counted with --boundary unless --dp is given')
+    parser.add_argument('--cache-size', type=int, help='maximum cached subproblems per line')
+    parser.add_argument('--shared-cache-size', type=int, default=0, help='size of the cross-line LRU cache')
+    parser.add_argument('--stats', action='store_true', help='print cache statistics to stderr')
+    parser.add_argument('--jobs', type=int, help='count lines in this many worker processes')
+    args = parser.parse_args()
+
     input_data = '\n'.join(line.rstrip() for line in stdin)
-    data = CachingPermuter(input_data)
+    if args.boundary or (args.unfold > RECURSIVE_UNFOLD_LIMIT and not args.dp):
+        permuter = BoundaryPermuter
+    elif args.dp:
+        permuter = DPPermuter
+    else:
+        permuter = CachingPermuter
+    data = permuter(input_data, line_cache_size=args.cache_size, shared_cache_size=args.shared_cache_size, unfold=args.unfold)
 
     # Print out the sum
-    print(sum(data.find_all_permutation_counts()))
+    if args.jobs:
+        print(sum(data.find_all_permutation_counts_parallel(args.jobs)))
+    else:
+        print(sum(data.find_all_permutation_counts()))
+
+    # Workers keep their own statistics, which are not collected
+    if args.stats and not args.jobs:
+        stats = data.cache_stats
+        lookups = stats['hits'] + stats['shared_hits'] + stats['misses']
+        print(stats, file=stderr)
+        if lookups:
+            print(f'hit rate: {(stats["hits"] + stats["shared_hits"]) / lookups:.1%}', file=stderr)
 
 # Test suite
 
 from parameterized import parameterized
 import unittest
 
+test_cases = [
+    ('#.#.### 1,1,3', 1),
+    ('.??..??...?##. 1,1,3', 16384),
+    ('?#?#?#?#?#?#?#? 1,3,1,6', 1),
+    ('????.#...#... 4,1,1', 16),
+    ('????.######..#####. 1,6,5', 2500),
+    ('?###???????? 3,2,1', 506250),
+]
+
 class Test(unittest.TestCase):
-    @parameterized.expand([
-        ('#.#.### 1,1,3', 1),
-        ('.??..??...?##. 1,1,3', 16384),
-        ('?#?#?#?#?#?#?#? 1,3,1,6', 1),
-        ('????.#...#... 4,1,1', 16),
-        ('????.######..#####. 1,6,5', 2500),
-        ('?###???????? 3,2,1', 506250),
-    ])
+    @parameterized.expand(test_cases)
     def test_permutations(self, input_data, expected):
         d('---')
         data = CachingPermuter(input_data)
         result = data.find_all_permutation_counts()
         self.assertEqual(expected, sum(result))
 
+    @parameterized.expand(test_cases)
+    def test_dp_permutations(self, input_data, expected):
+        data = DPPermuter(input_data)
+        result = data.find_all_permutation_counts()
+        self.assertEqual(expected, sum(result))
+
+    @parameterized.expand(test_cases)
+    def test_bounded_cache_permutations(self, input_data, expected):
+        data = CachingPermuter(input_data, line_cache_size=8, shared_cache_size=16)
+        result = data.find_all_permutation_counts()
+        self.assertEqual(expected, sum(result))
+        self.assertLessEqual(len(data.cache), 8)
+        self.assertLessEqual(len(data.shared_cache), 16)
+
+    @parameterized.expand(test_cases)
+    def test_boundary_permutations(self, input_data, expected):
+        data = BoundaryPermuter(input_data)
+        result = data.find_all_permutation_counts()
+        self.assertEqual(expected, sum(result))
+
+    @parameterized.expand(test_cases)
+    def test_unfold_factors(self, input_data, expected):
+        for unfold in (1, 2, 7):
+            dp = DPPermuter(input_data, unfold=unfold)
+            boundary = BoundaryPermuter(input_data, unfold=unfold)
+            self.assertEqual(
+                sum(dp.find_all_permutation_counts()),
+                sum(boundary.find_all_permutation_counts()))
+
+    @parameterized.expand(test_cases)
+    def test_parallel_permutations(self, input_data, expected):
+        data = CachingPermuter(input_data)
+        result = data.find_all_permutation_counts_parallel(2)
+        self.assertEqual(expected, sum(result))
+
 if __name__ == '__main__':
     if len(argv) > 1 and argv[1] == '-t':
         # Add the test suite
@@ -4,6 +4,7 @@ from collections import defaultdict
 from sys import stdin
 from typing import Iterable, List
 
+import numpy as np
 from pyparsing import Word, alphas, delimitedList, Keyword, Optional, Group, ZeroOrMore, ParseResults, White
 
 # The grammar is as follows:
@@ -239,6 +240,42 @@ class Almanac(object):
                 ) for r in m.mappings
             ])
             self.out_edges[m.source][m.target] = st
+        # Source kind -> (target kind, starts, ends, offsets), with each array
+        # sorted by source start, for vectorised lookups
+        self.offset_tables = {}
+        for m in result.maps:
+            ranges = sorted(
+                (int(r.source_start), int(r.length), int(r.target_start))
+                for r in m.mappings
+            )
+            self.offset_tables[m.source] = (
+                m.target,
+                np.array([s for s, l, t in ranges], dtype=np.int64),
+                np.array([s + l for s, l, t in ranges], dtype=np.int64),
+                np.array([t - s for s, l, t in ranges], dtype=np.int64),
+            )
+
+    def batch_lookup(self, ids: np.ndarray, source='seed', target='location') -> np.ndarray:
+        '''
+        Map an array of IDs of the source kind through each category in turn,
+        returning the corresponding array of IDs of the target kind.
+
+        Each category is a single searchsorted over the sorted range starts,
+        followed by adding the offset of any range which actually contains
+        the ID.
+        '''
+        ids = np.asarray(ids, dtype=np.int64)
+        kind = source
+        while kind != target:
+            kind, starts, ends, offsets = self.offset_tables[kind]
+            # Index of the last range starting at or before each ID
+            idx = np.searchsorted(starts, ids, side='right') - 1
+            clamped = np.maximum(idx, 0)
+            # Only IDs that fall before the end of that range are mapped;
+            # anything else maps to itself
+            mapped = (idx >= 0) & (ids < ends[clamped])
+            ids = ids + np.where(mapped, offsets[clamped], 0)
+        return ids
 
     def search(self, sources: List[AlmanacVertex], f=lambda: False, visited=set()):
         '''
@@ -259,10 +296,7 @@ class Almanac(object):
 # Parse all input data
 input_data = '\n'.join(line.rstrip() for line in stdin)
 data = Almanac(input_data)
-# Find all locations reachable from almanac seeds
-reachable_locations = list(data.search(
-    [AlmanacVertex('seed', s) for s in data.seeds],
-    lambda v: v.kind == 'location'
-))
+# Find the locations corresponding to each almanac seed
+locations = data.batch_lookup(np.array(data.seeds, dtype=np.int64))
 # Print the ID of the lowest reachable location
-print(min(reachable_locations, key=lambda v: v.id).id)
+print(int(locations.min()))
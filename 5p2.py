@@ -1,10 +1,13 @@
 #!/usr/bin/env python3
 
+from bisect import bisect_left, bisect_right
 from collections import defaultdict
-from sys import stdin
-from typing import Iterable, List
+import heapq
+from sys import argv, stdin
+from typing import Iterable, List, Tuple
 
 from pyparsing import Word, alphas, delimitedList, Keyword, Optional, Group, ZeroOrMore, ParseResults, White
+from sortedcontainers import SortedDict
 
 # The grammar is as follows:
 
@@ -264,16 +267,389 @@ class Almanac(object):
             for adj in n.adjacent_vertices(self):
                 to_visit.append([adj, *path])
 
+class DynamicMap(object):
+    '''
+    A mutable mapping between two kinds of almanac IDs.
+
+    Ranges are kept in a sorted dict keyed by source start, so individual
+    ranges can be inserted, removed or retargeted in O(log n) without
+    rebuilding anything. Ranges may not overlap.
+    '''
+    def __init__(self, ranges: Iterable[Tuple[int, int, int]] = ()):
+        # Source start -> (source end, target start)
+        self.ranges = SortedDict()
+        # Lazily built index of ranges by target start, for inverse queries
+        self.target_index = None
+        for source_start, length, target_start in ranges:
+            self.insert(source_start, length, target_start)
+
+    def insert(self, source_start: int, length: int, target_start: int) -> Tuple[int, int]:
+        '''
+        Add a new range mapping [source_start, source_start + length) onto
+        [target_start, target_start + length), returning its affected source
+        interval.
+        '''
+        source_end = source_start + length
+        # Check the neighbouring ranges on either side for overlap
+        i = self.ranges.bisect_left(source_start)
+        if i > 0 and self.ranges.peekitem(i - 1)[1][0] > source_start:
+            raise ValueError(f'Range [{source_start}, {source_end}) overlaps an existing range')
+        if i < len(self.ranges) and self.ranges.peekitem(i)[0] < source_end:
+            raise ValueError(f'Range [{source_start}, {source_end}) overlaps an existing range')
+        self.ranges[source_start] = (source_end, target_start)
+        self.target_index = None
+        return source_start, source_end
+
+    def remove(self, source_start: int) -> Tuple[int, int]:
+        '''
+        Remove the range starting at source_start, returning its affected
+        source interval.
+        '''
+        source_end, _ = self.ranges.pop(source_start)
+        self.target_index = None
+        return source_start, source_end
+
+    def retarget(self, source_start: int, target_start: int) -> Tuple[int, int]:
+        '''
+        Point the range starting at source_start at a new target start,
+        returning its affected source interval.
+        '''
+        source_end, _ = self.ranges[source_start]
+        self.ranges[source_start] = (source_end, target_start)
+        self.target_index = None
+        return source_start, source_end
+
+    def unmapped(self, start: int, end: int) -> Iterable[Tuple[int, int]]:
+        '''
+        Yield the parts of [start, end) not covered by any range.
+        '''
+        i = max(self.ranges.bisect_right(start) - 1, 0)
+        for source_start in self.ranges.islice(i):
+            if source_start >= end:
+                break
+            source_end, _ = self.ranges[source_start]
+            if source_end <= start:
+                continue
+            if start < source_start:
+                yield (start, source_start)
+            start = max(start, source_end)
+        if start < end:
+            yield (start, end)
+
+    def preimage(self, start: int, end: int) -> Iterable[Tuple[int, int, int]]:
+        '''
+        Yield (target start, target end, delta) for every part of the target
+        interval [start, end) that some source maps onto, where the source
+        is the target plus delta.
+
+        Targets may be reached both through a range and by an unmapped
+        source mapping to itself, so the yielded parts may overlap.
+        '''
+        if self.target_index is None:
+            ranges = sorted(
+                (target_start, target_start + source_end - source_start, source_start - target_start)
+                for source_start, (source_end, target_start) in self.ranges.items()
+            )
+            starts = [r[0] for r in ranges]
+            longest = max((r[1] - r[0] for r in ranges), default=0)
+            self.target_index = (ranges, starts, longest)
+        ranges, starts, longest = self.target_index
+        # Only ranges starting within one longest range length of our start
+        # can reach into our interval
+        for i in range(bisect_left(starts, start - longest), bisect_left(starts, end)):
+            target_start, target_end, delta = ranges[i]
+            if target_end > start:
+                yield (max(start, target_start), min(end, target_end), delta)
+        # Unmapped sources map to themselves
+        for gap_start, gap_end in self.unmapped(start, end):
+            yield (gap_start, gap_end, 0)
+
+    def map_range(self, start: int, end: int) -> Iterable[Tuple[int, int]]:
+        '''
+        Yield the half-open target intervals covered by [start, end).
+
+        Any part of the interval not covered by a range maps to itself.
+        '''
+        # Begin from the last range starting at or before our start, as it
+        # may still extend into our interval
+        i = max(self.ranges.bisect_right(start) - 1, 0)
+        for source_start in self.ranges.islice(i):
+            if source_start >= end:
+                break
+            source_end, target_start = self.ranges[source_start]
+            if source_end <= start:
+                continue
+            # Unmapped gap before this range
+            if start < source_start:
+                yield (start, source_start)
+                start = source_start
+            overlap_end = min(source_end, end)
+            offset = target_start - source_start
+            yield (start + offset, overlap_end + offset)
+            start = overlap_end
+        # Unmapped remainder after the last overlapping range
+        if start < end:
+            yield (start, end)
+
+def merge_intervals(intervals: Iterable[Tuple[int, int]]) -> List[Tuple[int, int]]:
+    '''
+    Merge a collection of half-open intervals into a sorted list of disjoint
+    intervals.
+    '''
+    merged = []
+    for start, end in sorted(intervals):
+        if merged and start <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+def subtract_intervals(intervals: List[Tuple[int, int]], removed: List[Tuple[int, int]]) -> List[Tuple[int, int]]:
+    '''
+    Return the parts of a sorted list of disjoint half-open intervals not
+    covered by another such list.
+    '''
+    result = []
+    i = 0
+    for start, end in intervals:
+        # Skip removed intervals entirely before this one
+        while i < len(removed) and removed[i][1] <= start:
+            i += 1
+        j = i
+        while j < len(removed) and removed[j][0] < end:
+            removed_start, removed_end = removed[j]
+            if start < removed_start:
+                result.append((start, removed_start))
+            start = max(start, removed_end)
+            j += 1
+        if start < end:
+            result.append((start, end))
+    return result
+
+class IntervalCounts(object):
+    '''
+    A multiset of IDs, stored as a step function of how many times each ID
+    occurs.
+
+    Each key in the sorted dict is a point where the count changes, mapping
+    to the count from there up to the next key. IDs below the first key
+    have a count of 0.
+    '''
+    def __init__(self, intervals: Iterable[Tuple[int, int]] = ()):
+        self.steps = SortedDict()
+        for start, end in intervals:
+            self.add(start, end, 1)
+
+    def count(self, point: int) -> int:
+        i = self.steps.bisect_right(point) - 1
+        return self.steps.peekitem(i)[1] if i >= 0 else 0
+
+    def add(self, start: int, end: int, delta: int):
+        '''
+        Add delta to the count of every ID in [start, end).
+        '''
+        if start >= end:
+            return
+        for point in (start, end):
+            if point not in self.steps:
+                self.steps[point] = self.count(point)
+        for point in list(self.steps.irange(start, end, inclusive=(True, False))):
+            self.steps[point] += delta
+        # Steps inside the interval all moved together, so only the ends
+        # can have stopped changing the count
+        for point in (start, end):
+            if self.steps[point] == self.count(point - 1):
+                del self.steps[point]
+
+    def support(self, start: int = None, end: int = None) -> List[Tuple[int, int]]:
+        '''
+        Return the sorted disjoint intervals of IDs with a nonzero count,
+        optionally clipped to [start, end).
+        '''
+        if not self.steps:
+            return []
+        if start is None:
+            start = self.steps.peekitem(0)[0]
+        if end is None:
+            end = self.steps.peekitem(-1)[0]
+        result = []
+        run_start = None
+        i = max(self.steps.bisect_right(start) - 1, 0)
+        for point in self.steps.islice(i):
+            if point >= end:
+                break
+            piece_start = max(point, start)
+            if self.steps[point]:
+                if run_start is None:
+                    run_start = piece_start
+            elif run_start is not None:
+                result.append((run_start, piece_start))
+                run_start = None
+        if run_start is not None:
+            result.append((run_start, end))
+        return result
+
+    def replace(self, removed: List[Tuple[int, int]], added: List[Tuple[int, int]]) -> Tuple[List[Tuple[int, int]], List[Tuple[int, int]]]:
+        '''
+        Remove one occurrence of each ID in the removed intervals and add
+        one of each in the added intervals.
+
+        Return the intervals which left the support, and those which joined
+        it.
+        '''
+        touched = merge_intervals(removed + added)
+        before = [piece for start, end in touched for piece in self.support(start, end)]
+        for start, end in removed:
+            self.add(start, end, -1)
+        for start, end in added:
+            self.add(start, end, 1)
+        after = [piece for start, end in touched for piece in self.support(start, end)]
+        return subtract_intervals(before, after), subtract_intervals(after, before)
+
+class IncrementalAlmanac(object):
+    '''
+    An almanac whose maps can be edited in place, with the lowest location
+    reachable from the seed ranges re-queried after each edit.
+
+    The image of the seed ranges after each stage of the seed -> location
+    chain is cached, counting how many IDs of the previous image reach each
+    ID. An edit to a map only changes where its affected source interval
+    goes, so only the part of that stage's image inside the interval is
+    remapped. Whatever enters or leaves the next image is then pushed
+    through the following maps in the same way, stopping as soon as an
+    image is unchanged. Earlier stages are never touched.
+    '''
+    def __init__(self, input_data: str):
+        result = almanac.parse_string(input_data, parse_all=True)
+        self.seeds = merge_intervals((int(s), int(s) + int(l)) for [s, l] in result.seeds)
+        maps = {m.source: m for m in result.maps}
+        # Follow the chain of categories from seed to location
+        self.kinds = ['seed']
+        self.maps = []
+        while self.kinds[-1] in maps:
+            m = maps[self.kinds[-1]]
+            self.maps.append(DynamicMap(
+                (int(r.source_start), int(r.length), int(r.target_start)) for r in m.mappings
+            ))
+            self.kinds.append(m.target)
+        # images[k] counts the IDs reachable after k stages
+        self.images = [IntervalCounts(self.seeds)]
+
+    def stage(self, source_kind: str) -> int:
+        return self.kinds.index(source_kind)
+
+    def _update(self, stage: int, start: int, end: int, old_offset: int, new_offset: int):
+        '''
+        Update the cached images after the map at the given stage changed
+        the offset applied to source IDs in [start, end).
+        '''
+        if len(self.images) <= stage + 1:
+            return
+        pieces = self.images[stage].support(start, end)
+        removed = [(s + old_offset, e + old_offset) for s, e in pieces]
+        added = [(s + new_offset, e + new_offset) for s, e in pieces]
+        for k in range(stage + 1, len(self.images)):
+            left, joined = self.images[k].replace(removed, added)
+            if (not left and not joined) or k + 1 == len(self.images):
+                break
+            m = self.maps[k]
+            removed = [mapped for s, e in left for mapped in m.map_range(s, e)]
+            added = [mapped for s, e in joined for mapped in m.map_range(s, e)]
+
+    def insert_range(self, source_kind: str, source_start: int, length: int, target_start: int):
+        stage = self.stage(source_kind)
+        # Ranges may not overlap, so the interval was previously unmapped
+        start, end = self.maps[stage].insert(source_start, length, target_start)
+        self._update(stage, start, end, 0, target_start - start)
+
+    def remove_range(self, source_kind: str, source_start: int):
+        stage = self.stage(source_kind)
+        _, old_target = self.maps[stage].ranges[source_start]
+        start, end = self.maps[stage].remove(source_start)
+        self._update(stage, start, end, old_target - start, 0)
+
+    def retarget_range(self, source_kind: str, source_start: int, target_start: int):
+        stage = self.stage(source_kind)
+        _, old_target = self.maps[stage].ranges[source_start]
+        start, end = self.maps[stage].retarget(source_start, target_start)
+        self._update(stage, start, end, old_target - start, target_start - start)
+
+    def image(self, target_kind='location') -> List[Tuple[int, int]]:
+        '''
+        Return the disjoint intervals of the target kind reachable from the
+        seed ranges, computing any stages not yet cached.
+        '''
+        target_stage = self.stage(target_kind)
+        while len(self.images) <= target_stage:
+            m = self.maps[len(self.images) - 1]
+            self.images.append(IntervalCounts(
+                mapped for start, end in self.images[-1].support() for mapped in m.map_range(start, end)
+            ))
+        return self.images[target_stage].support()
+
+    def lowest_location(self) -> int:
+        return self.image('location')[0][0]
+
+    def lowest_location_by_preimage(self) -> int:
+        '''
+        Find the lowest location by searching backwards from location space.
+
+        Location intervals are pulled back through the inverse of each map in
+        turn. A heap keyed on the lowest location in each interval means
+        intervals are explored in ascending order, so the search stops as
+        soon as no remaining interval could beat the best location found,
+        without enumerating every reachable location range.
+        '''
+        seed_starts = [s for s, e in self.seeds]
+        # Nothing above every endpoint in the almanac is ever remapped
+        bound = max(
+            [e for s, e in self.seeds] +
+            [max(source_end, target_start + source_end - source_start)
+                for m in self.maps
+                for source_start, (source_end, target_start) in m.ranges.items()]
+        )
+        best = None
+        # (location start, location end, maps left to invert, delta), where
+        # the ID in the current kind is the location plus delta
+        to_visit = [(0, bound, len(self.maps), 0)]
+        while to_visit:
+            start, end, stage, delta = heapq.heappop(to_visit)
+            if best is not None and start >= best:
+                break
+            if stage == 0:
+                # Find the first seed range that could contain our interval
+                i = max(bisect_right(seed_starts, start + delta) - 1, 0)
+                for seed_start, seed_end in self.seeds[i:]:
+                    if seed_start >= end + delta:
+                        break
+                    if seed_end > start + delta:
+                        found = max(seed_start, start + delta) - delta
+                        if best is None or found < best:
+                            best = found
+                        break
+                continue
+            for piece_start, piece_end, piece_delta in self.maps[stage - 1].preimage(start + delta, end + delta):
+                heapq.heappush(to_visit, (
+                    piece_start - delta, piece_end - delta, stage - 1, delta + piece_delta
+                ))
+        if best is None:
+            raise ValueError('No location reachable from any seed')
+        return best
+
 # Parse all input data
 input_data = '\n'.join(line.rstrip() for line in stdin)
-data = Almanac(input_data)
-# Find all locations reachable from almanac seeds
-def seeds():
-    for s, l in data.seeds:
-        yield AlmanacVertex('seed', s, l)
-reachable_locations = list(data.search(
-    seeds(),
-    lambda v: v.kind == 'location'
-))
-# Print the ID of the lowest reachable location
-print(min(reachable_locations, key=lambda v: v.id_start).id_start)
+if len(argv) > 1 and argv[1] == '--reverse':
+    # Search backwards from the lowest locations instead
+    print(IncrementalAlmanac(input_data).lowest_location_by_preimage())
+else:
+    data = Almanac(input_data)
+    # Find all locations reachable from almanac seeds
+    def seeds():
+        for s, l in data.seeds:
+            yield AlmanacVertex('seed', s, l)
+    reachable_locations = list(data.search(
+        seeds(),
+        lambda v: v.kind == 'location'
+    ))
+    # Print the ID of the lowest reachable location
+    print(min(reachable_locations, key=lambda v: v.id_start).id_start)
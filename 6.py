@@ -1,10 +1,10 @@
 #!/usr/bin/env python3
 
-from functools import reduce
-from math import ceil, floor
+from math import floor, isqrt
 from sys import stdin
-from typing import Iterable, List, Tuple
+from typing import Iterable, List, Optional, Sequence, Tuple
 
+import numpy as np
 from pyparsing import Word, Keyword, Group, ZeroOrMore, ParseResults
 
 # The grammar is as follows:
@@ -53,18 +53,31 @@ class Race(object):
         Returns a half open interval [start, end) describing the values of s
         such that 0 <= s <= time and s * (time - s) > distance, and s is
         an integer.
-        '''
-        lower, upper = self.viable_range()
-
-        # Avoid solutions that only equal, rather than beat, the current
-        # record
-        epsilon = 1e-10
 
-        # clamp to the range [0, t]
-        start = max(0, min(lower + epsilon, self.time))
-        end = min(max(0, upper - epsilon), self.time)
-
-        return (ceil(start), ceil(end))
+        This is computed exactly with integer arithmetic, so remains correct
+        for times and distances far beyond float precision.
+        '''
+        t, d = self.time, self.distance
+        # The best we can do is holding for half the time. If that doesn't
+        # beat the record, nothing will.
+        half = t // 2
+        if half * (t - half) <= d:
+            return (0, 0)
+
+        # The real lower root is (t - sqrt(t^2 - 4d)) / 2. isqrt gives the
+        # floor of the square root, so this estimate is within one or two of
+        # the first integer that strictly beats the record.
+        start = max(0, (t - isqrt(t * t - 4 * d)) // 2)
+        # Nudge the estimate onto the boundary: step up past any value that
+        # only equals or loses to the record, then step back down while the
+        # previous value still wins
+        while start * (t - start) <= d:
+            start += 1
+        while start > 0 and (start - 1) * (t - start + 1) > d:
+            start -= 1
+
+        # The winning values are symmetric about t / 2
+        return (start, t - start + 1)
     
     def viable_integer_count(self) -> int:
         '''
@@ -76,12 +89,121 @@ class Race(object):
             return 0
         return end - start
 
+def product_tree(values: List[int]) -> int:
+    '''
+    Multiply a list of exact integers together pairwise, keeping operands of
+    similar size so that big int products stay cheap.
+    '''
+    values = list(values)
+    if not values:
+        return 1
+    while len(values) > 1:
+        paired = [l * r for l, r in zip(values[0::2], values[1::2])]
+        if len(values) % 2:
+            paired.append(values[-1])
+        values = paired
+    return values[0]
+
+class RaceTable(object):
+    '''
+    A table of many races, held as NumPy int64 columns so that the viable
+    counts of every race can be computed at once.
+
+    Rows whose intermediate values would overflow int64 are solved exactly
+    with Race instead.
+    '''
+    # t * t and 4 * d must both stay comfortably within an int64
+    time_limit = 1 << 31
+    distance_limit = 1 << 60
+
+    def __init__(self, times: Sequence[int], distances: Sequence[int]):
+        try:
+            self.times = np.asarray(times, dtype=np.int64)
+            self.distances = np.asarray(distances, dtype=np.int64)
+            self.overflow = (self.times > self.time_limit) | (self.distances > self.distance_limit)
+            self.exact = [
+                Race(int(t), int(d))
+                for t, d in zip(self.times[self.overflow], self.distances[self.overflow])
+            ]
+        except OverflowError:
+            # Some values don't even fit in an int64 column. Zero them out in
+            # the vectorised columns and solve those rows exactly.
+            self.overflow = np.array([
+                t > self.time_limit or d > self.distance_limit for t, d in zip(times, distances)
+            ], dtype=bool)
+            self.exact = [Race(int(t), int(d)) for t, d, o in zip(times, distances, self.overflow) if o]
+            self.times = np.array([0 if o else t for t, o in zip(times, self.overflow)], dtype=np.int64)
+            self.distances = np.array([0 if o else d for d, o in zip(distances, self.overflow)], dtype=np.int64)
+
+    def viable_counts(self) -> np.ndarray:
+        '''
+        Returns the number of ways to beat the record in each race, for every
+        race that fits in int64 arithmetic. Overflowing rows are zero here;
+        see exact_counts.
+        '''
+        t = np.where(self.overflow, 0, self.times)
+        d = np.where(self.overflow, 0, self.distances)
+
+        # Integer square root of the discriminant, from a float estimate
+        # corrected onto the exact floor
+        discriminant = np.maximum(t * t - 4 * d, 0)
+        root = np.sqrt(discriminant.astype(np.float64)).astype(np.int64)
+        while (mask := root * root > discriminant).any():
+            root -= mask
+        while (mask := (root + 1) * (root + 1) <= discriminant).any():
+            root += mask
+
+        # Lower bound estimate, then nudge it onto the exact boundary, as in
+        # Race.viable_integer_range
+        half = t // 2
+        viable = half * (t - half) > d
+        start = np.where(viable, np.maximum((t - root) // 2, 0), 0)
+        while (mask := viable & (start * (t - start) <= d)).any():
+            start += mask
+        while (mask := viable & (start > 0) & ((start - 1) * (t - start + 1) > d)).any():
+            start -= mask
+
+        return np.where(viable, t - 2 * start + 1, 0)
+
+    def exact_counts(self) -> List[int]:
+        '''
+        Returns the number of ways to beat the record in each overflowing
+        race.
+        '''
+        return [r.viable_integer_count() for r in self.exact]
+
+    def product(self, modulus: Optional[int] = None) -> int:
+        '''
+        Returns the product of the number of ways to win each race, either
+        exactly or modulo the given modulus.
+        '''
+        counts = self.viable_counts()[~self.overflow]
+        exact = self.exact_counts()
+        if modulus is None:
+            return product_tree([int(c) for c in counts] + exact)
+        if modulus > self.time_limit:
+            # Products of residues could overflow an int64
+            return product_tree([int(c) % modulus for c in counts] + [c % modulus for c in exact]) % modulus
+        # Multiply neighbouring residues pairwise until one remains
+        residues = counts % modulus
+        while len(residues) > 1:
+            if len(residues) % 2:
+                residues = np.append(residues, 1)
+            residues = residues[0::2] * residues[1::2] % modulus
+        result = int(residues[0]) if len(residues) else 1
+        for c in exact:
+            result = result * c % modulus
+        return result
+
 class Document(object):
     def __init__(self, input_data):
         result = document.parse_string(input_data, parse_all=True)
         races = zip(result.times, result.distances)
         self.races = [Race(int(t), int(d)) for t,d in races]
 
+    def race_table(self) -> RaceTable:
+        return RaceTable([r.time for r in self.races], [r.distance for r in self.races])
+
 input_data = '\n'.join(line.rstrip() for line in stdin)
 data = Document(input_data)
 
@@ -90,4 +212,4 @@ data = Document(input_data)
 #    print(r.viable_range(), r.viable_integer_range(), r.viable_integer_count())
 
 # Print out the product of the number of different ways we could win each race
-print(reduce(lambda l,r: l*r, (r.viable_integer_count() for r in data.races)))
+print(data.race_table().product())
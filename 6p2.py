@@ -1,7 +1,7 @@
 #!/usr/bin/env python3
 
 from functools import reduce
-from math import ceil, floor
+from math import floor, isqrt
 from sys import stdin
 from typing import Iterable, List, Tuple
 
@@ -53,18 +53,31 @@ class Race(object):
         Returns a half open interval [start, end) describing the values of s
         such that 0 <= s <= time and s * (time - s) > distance, and s is
         an integer.
-        '''
-        lower, upper = self.viable_range()
-
-        # Avoid solutions that only equal, rather than beat, the current
-        # record
-        epsilon = 1e-10
 
-        # clamp to the range [0, t]
-        start = max(0, min(lower + epsilon, self.time))
-        end = min(max(0, upper - epsilon), self.time)
-
-        return (ceil(start), ceil(end))
+        This is computed exactly with integer arithmetic, so remains correct
+        for times and distances far beyond float precision.
+        '''
+        t, d = self.time, self.distance
+        # The best we can do is holding for half the time. If that doesn't
+        # beat the record, nothing will.
+        half = t // 2
+        if half * (t - half) <= d:
+            return (0, 0)
+
+        # The real lower root is (t - sqrt(t^2 - 4d)) / 2. isqrt gives the
+        # floor of the square root, so this estimate is within one or two of
+        # the first integer that strictly beats the record.
+        start = max(0, (t - isqrt(t * t - 4 * d)) // 2)
+        # Nudge the estimate onto the boundary: step up past any value that
+        # only equals or loses to the record, then step back down while the
+        # previous value still wins
+        while start * (t - start) <= d:
+            start += 1
+        while start > 0 and (start - 1) * (t - start + 1) > d:
+            start -= 1
+
+        # The winning values are symmetric about t / 2
+        return (start, t - start + 1)
     
     def viable_integer_count(self) -> int:
         '''
@@ -1,9 +1,13 @@
 #!/usr/bin/env python3
 
-from collections import defaultdict
+from array import array
+from collections import Counter
 from enum import Enum
-from functools import cmp_to_key
-from sys import stdin
+from hashlib import sha256
+from itertools import combinations_with_replacement, product
+from pathlib import Path
+from sys import argv, stdin
+from typing import Iterable, Tuple
 
 from pyparsing import Word, Group, ZeroOrMore
 
@@ -27,53 +31,154 @@ class HandType(Enum):
     FOUR_OF_A_KIND = 5
     FIVE_OF_A_KIND = 6
 
+def signature(cards: Iterable[str]) -> Tuple[int, Tuple[int, ...]]:
+    '''
+    Return the multiset signature of a hand: the number of jokers, and the
+    sorted counts of each regular card.
+    '''
+    card_counts = Counter(cards)
+    jokers = card_counts.pop('J', 0)
+    return jokers, tuple(sorted(card_counts.values()))
+
+def classify(signature: Tuple[int, Tuple[int, ...]]) -> HandType:
+    '''
+    Return the type of a hand with the given signature.
+
+    This is only used to generate the type table.
+    '''
+    jokers, counts = signature
+    counts = list(counts)
+    # Special case: No regular cards to consider
+    if jokers == 5:
+        return HandType.FIVE_OF_A_KIND
+
+    # Get the various counts of regular cards
+    highest = counts[-1] + jokers
+
+    if highest == 5:
+        return HandType.FIVE_OF_A_KIND
+    if highest == 4:
+        return HandType.FOUR_OF_A_KIND
+    if counts == [2, 3]:
+        return HandType.FULL_HOUSE
+    # Note that if we had three jokers, we could always make four of a
+    # kind, so we can have at most two jokers.
+    # If we have two jokers, we can have at most one of any other card,
+    # since two of any other card would have let us make four of a kind.
+    # This means we can never make a full house with two jokers at this
+    # point.
+    if jokers == 1 and counts[-2:] == [2,2]:
+        return HandType.FULL_HOUSE
+    if highest == 3:
+        return HandType.THREE_OF_A_KIND
+    if counts[-2:] == [2, 2]:
+        return HandType.TWO_PAIR
+    # Similarly, if we had at least two jokers, we could always make
+    # three of a kind, so we can have at most one joker at this point.
+    if counts[-1] == 2 and jokers == 1:
+        return HandType.TWO_PAIR
+    if highest == 2:
+        return HandType.PAIR
+    return HandType.HIGH_CARD
+
+def encode(cards: str) -> int:
+    '''
+    Encode a hand as a base 13 number, with one digit per card value.
+    '''
+    code = 0
+    for card in cards:
+        code = code * len(card_characters) + card_values[card]
+    return code
+
+def generate_type_table() -> bytes:
+    '''
+    Generate a table of hand type values, indexed by encoded hand.
+
+    Each multiset signature is only classified once.
+    '''
+    signature_types = {}
+    table = bytearray()
+    # product() enumerates hands in the same order as their encoding
+    for cards in product(card_characters, repeat=5):
+        sig = signature(cards)
+        if sig not in signature_types:
+            signature_types[sig] = classify(sig).value
+        table.append(signature_types[sig])
+    return bytes(table)
+
+def type_table_fingerprint() -> bytes:
+    '''
+    Return a digest of everything the type table depends on: the card order,
+    and the type of each signature.
+
+    Every signature turns up in some unordered hand, so this only needs to
+    classify a few thousand hands rather than the whole table.
+    '''
+    signature_types = {}
+    for cards in combinations_with_replacement(card_characters, 5):
+        sig = signature(cards)
+        if sig not in signature_types:
+            signature_types[sig] = classify(sig).value
+    return sha256(repr((card_characters, sorted(signature_types.items()))).encode()).digest()
+
+def load_type_table(rules: str) -> bytes:
+    '''
+    Load the type table for the named rule set from disk, generating and
+    saving it first if needed.
+
+    The file starts with the fingerprint of the rules it was generated for,
+    and a checksum of the table, so a stale or corrupt table is regenerated
+    rather than used. If the table can't be saved, the generated table is
+    used anyway.
+    '''
+    path = Path(__file__).with_name(f'hand_types.{rules}.bin')
+    fingerprint = type_table_fingerprint()
+    try:
+        data = path.read_bytes()
+        header, checksum, table = data[:32], data[32:64], data[64:]
+        if header == fingerprint and checksum == sha256(table).digest() and len(table) == len(card_characters) ** 5:
+            return table
+    except OSError:
+        pass
+    table = generate_type_table()
+    try:
+        path.write_bytes(fingerprint + sha256(table).digest() + table)
+    except OSError:
+        pass
+    return table
+
+type_table = load_type_table('jokers')
+
 class Hand(object):
     def __init__(self, cards: str, bid: int):
         self.cards = cards
-        self.card_counts = defaultdict(int)
         self.bid = bid
-        for card in cards:
-            self.card_counts[card] += 1
-        self.jokers = self.card_counts['J']
-        del self.card_counts['J']
+        self.key = self.pack_key()
 
     def type(self):
         '''
         Return the type of this hand.
         '''
-        # Special case: No regular cards to consider
-        if self.jokers == 5:
-            return HandType.FIVE_OF_A_KIND
-
-        # Get the various counts of regular cards
-        counts = sorted(self.card_counts.values())
-        highest = counts[-1] + self.jokers
-
-        if highest == 5:
-            return HandType.FIVE_OF_A_KIND
-        if highest == 4:
-            return HandType.FOUR_OF_A_KIND
-        if counts == [2, 3]:
-            return HandType.FULL_HOUSE
-        # Note that if we had three jokers, we could always make four of a
-        # kind, so we can have at most two jokers.
-        # If we have two jokers, we can have at most one of any other card,
-        # since two of any other card would have let us make four of a kind.
-        # This means we can never make a full house with two jokers at this
-        # point.
-        if self.jokers == 1 and counts[-2:] == [2,2]:
-            return HandType.FULL_HOUSE
-        if highest == 3:
-            return HandType.THREE_OF_A_KIND
-        if counts[-2:] == [2, 2]:
-            return HandType.TWO_PAIR
-        # Similarly, if we had at least two jokers, we could always make
-        # three of a kind, so we can have at most one joker at this point.
-        if counts[-1] == 2 and self.jokers == 1:
-            return HandType.TWO_PAIR
-        if highest == 2:
-            return HandType.PAIR
-        return HandType.HIGH_CARD
+        return HandType(type_table[encode(self.cards)])
+
+    def pack_key(self) -> int:
+        '''
+        Return a single integer that sorts hands in rank order.
+
+        The hand type occupies the high bits, followed by four bits for the
+        value of each card in definition order.
+        '''
+        key = self.type().value
+        for card in self.cards:
+            key = key << 4 | card_values[card]
+        return key
+
+    def compact_key(self) -> int:
+        '''
+        Return an integer in [0, len(HandType) * 13^5) that sorts hands in
+        rank order, suitable for indexing.
+        '''
+        return self.type().value * len(card_characters) ** 5 + encode(self.cards)
 
     def winnings(self):
         return self.bid * self.rank
@@ -86,28 +191,130 @@ class Document(object):
         '''
         Update the ranks of all hands. Hands are sorted first by type, then by
         the value of each card in their hand, in definition order.
+
+        Both are already packed into each hand's key.
         '''
-        def comparator(l, r):
-            # Sort first by type
-            if l.type() != r.type():
-                return l.type().value - r.type().value
-            for lc, rc in zip(l.cards, r.cards):
-                if lc != rc:
-                    return card_values[lc] - card_values[rc]
-            return 0
-        s = sorted(self.hands, key=cmp_to_key(comparator))
+        s = sorted(self.hands, key=lambda hand: hand.key)
         # Notify each hand of its new rank
         for i, hand in enumerate(s):
             hand.rank = i + 1
         self.hands = s
 
-input_data = '\n'.join(line.rstrip() for line in stdin)
-data = Document(input_data)
-data.update_ranks()
+class FenwickTree(object):
+    '''
+    A binary indexed tree over a fixed number of slots, supporting point
+    updates and prefix sums in O(log n).
+    '''
+    def __init__(self, size: int):
+        self.tree = [0] * (size + 1)
+
+    def add(self, i: int, value: int):
+        '''
+        Add value to slot i.
+        '''
+        i += 1
+        while i < len(self.tree):
+            self.tree[i] += value
+            i += i & -i
+
+    def prefix_sum(self, i: int) -> int:
+        '''
+        Return the sum of slots [0, i).
+        '''
+        total = 0
+        while i > 0:
+            total += self.tree[i]
+            i -= i & -i
+        return total
+
+class WinningsTracker(object):
+    '''
+    Maintain the total winnings of a growing set of hands.
+
+    Hands are indexed by compact key in two Fenwick trees, one counting
+    hands and one summing their bids. Inserting a hand then costs
+    O(log K) for K possible keys: the new hand gains its own rank times its
+    bid, and every hand ranked above it moves up one rank, adding their bids
+    once more.
+    '''
+    def __init__(self):
+        size = len(HandType) * len(card_characters) ** 5
+        self.counts = FenwickTree(size)
+        self.bids = FenwickTree(size)
+        self.hands = 0
+        self.bid_total = 0
+        self.total = 0
+
+    def insert(self, hand: Hand) -> int:
+        '''
+        Add a hand, returning the new total winnings.
+        '''
+        key = hand.compact_key()
+        # Equal hands keep insertion order, so the new hand ranks after any
+        # existing hand with the same key
+        rank = self.counts.prefix_sum(key + 1) + 1
+        bids_above = self.bid_total - self.bids.prefix_sum(key + 1)
+        self.total += rank * hand.bid + bids_above
+        self.counts.add(key, 1)
+        self.bids.add(key, hand.bid)
+        self.hands += 1
+        self.bid_total += hand.bid
+        return self.total
+
+def streaming_winnings(lines: Iterable[str]) -> int:
+    '''
+    Find the total winnings of a stream of "cards bid" lines without keeping
+    any per-hand state.
+
+    The first pass builds a histogram over compact keys of the number of
+    hands, their bid sum, and the sum of each bid weighted by its position
+    among equal hands, to preserve the input order of ties. The second pass
+    walks the histogram in key order: hands with a given key take the next
+    ranks after every lower key, so their winnings follow directly.
+    '''
+    hand_codes = len(card_characters) ** 5
+    size = len(HandType) * hand_codes
+    counts = array('q', bytes(8 * size))
+    bids = array('q', bytes(8 * size))
+    weighted_bids = array('q', bytes(8 * size))
+    for line in lines:
+        if not line.strip():
+            continue
+        cards, bid = line.split()
+        bid = int(bid)
+        code = encode(cards)
+        key = type_table[code] * hand_codes + code
+        counts[key] += 1
+        bids[key] += bid
+        weighted_bids[key] += counts[key] * bid
+
+    total = 0
+    lower = 0
+    for key in range(size):
+        if counts[key]:
+            # Ranks lower + 1 ... lower + count, in input order
+            total += lower * bids[key] + weighted_bids[key]
+            lower += counts[key]
+    return total
+
+if len(argv) > 1 and argv[1] == '--stream':
+    print(streaming_winnings(stdin))
+elif len(argv) > 1 and argv[1] == '--online':
+    # Print the running total winnings as each hand arrives
+    tracker = WinningsTracker()
+    for line in stdin:
+        if not line.strip():
+            continue
+        cards, bid = line.split()
+        print(tracker.insert(Hand(cards, int(bid))), flush=True)
+else:
+    input_data = '\n'.join(line.rstrip() for line in stdin)
+    data = Document(input_data)
+    data.update_ranks()
 
-# Print the winnings for each hand
-#for hand in data.hands:
-#    print(hand.cards, hand.bid, hand.type().name, hand.rank, hand.winnings())
+    # Print the winnings for each hand
+    #for hand in data.hands:
+    #    print(hand.cards, hand.bid, hand.type().name, hand.rank, hand.winnings())
 
-# Print the sum total winnings
-print(sum(hand.winnings() for hand in data.hands))
+    # Print the sum total winnings
+    print(sum(hand.winnings() for hand in data.hands))
@@ -2,7 +2,7 @@
 
 from itertools import cycle
 from sys import stdin
-from typing import List
+from typing import Callable, Dict, List, Tuple
 
 from pyparsing import alphas, delimitedList, Group, Keyword, White, Word, ZeroOrMore
 
@@ -19,6 +19,89 @@ class Vertex(object):
     def __repr__(self):
         return f'Vertex({self.name}, {self.edges})'
 
+class JumpTable(object):
+    '''
+    An interned form of the graph for fast long walks.
+
+    Node names are interned to integers, and the left and right edges are
+    stored as two lists. For each node we precompute where one full pass of
+    the direction string leaves us, and the first step within that pass (if
+    any) that lands on an end node. Binary lifting over whole passes then
+    answers both "where are we after n steps" and "when do we first reach an
+    end node" in time logarithmic in the number of passes.
+    '''
+    def __init__(self, directions: str, edges: Dict[str, Tuple[str, str]], end_criteria: Callable[[str], bool]):
+        self.names = list(edges.keys())
+        self.index = {name: i for i, name in enumerate(self.names)}
+        self.left = [self.index[edges[name][0]] for name in self.names]
+        self.right = [self.index[edges[name][1]] for name in self.names]
+        self.directions = [self.left if d == 'L' else self.right for d in directions]
+        self.period = len(self.directions)
+        self.is_end = [end_criteria(name) for name in self.names]
+
+        # Destination after one pass, and the first offset in [0, period)
+        # within that pass that sits on an end node (or None)
+        self.pass_destination = []
+        self.first_end = []
+        for node in range(len(self.names)):
+            first_end = None
+            for offset, table in enumerate(self.directions):
+                if first_end is None and self.is_end[node]:
+                    first_end = offset
+                node = table[node]
+            self.pass_destination.append(node)
+            self.first_end.append(first_end)
+
+        # jumps[k][v] is the node reached after 2^k passes from v, and
+        # reaches_end[k][v] is whether an end node is seen at some offset
+        # along the way. Enough levels are kept that any walk must have
+        # entered its cycle of passes, and gone around it, by the last one.
+        self.jumps = [self.pass_destination]
+        self.reaches_end = [[f is not None for f in self.first_end]]
+        self.extend_levels(2 * len(self.names))
+
+    def extend_levels(self, passes: int):
+        '''
+        Add binary lifting levels until a single jump can cover the given
+        number of passes.
+        '''
+        while (1 << len(self.jumps)) <= passes:
+            prev_jumps, prev_reaches = self.jumps[-1], self.reaches_end[-1]
+            self.jumps.append([prev_jumps[prev_jumps[v]] for v in range(len(self.names))])
+            self.reaches_end.append([
+                prev_reaches[v] or prev_reaches[prev_jumps[v]] for v in range(len(self.names))
+            ])
+
+    def position_after(self, start: str, steps: int) -> str:
+        '''
+        Return the node reached after walking the given number of steps.
+        '''
+        node = self.index[start]
+        passes, remainder = divmod(steps, self.period)
+        self.extend_levels(passes)
+        for level in range(passes.bit_length()):
+            if passes & 1 << level:
+                node = self.jumps[level][node]
+        for table in self.directions[:remainder]:
+            node = table[node]
+        return self.names[node]
+
+    def first_end_from(self, start: str) -> int:
+        '''
+        Return the number of steps taken before first standing on an end
+        node, which is zero if we start on one.
+        '''
+        node = self.index[start]
+        passes = 0
+        # Skip as many whole passes as possible without seeing an end node
+        for level in reversed(range(len(self.jumps))):
+            if not self.reaches_end[level][node]:
+                node = self.jumps[level][node]
+                passes += 1 << level
+        if self.first_end[node] is None:
+            raise ValueError(f'No end node reachable from {start}')
+        return passes * self.period + self.first_end[node]
+
 class Document(object):
     def __init__(self, input_data: str):
         data = document.parse_string(input_data, parse_all=True)
@@ -27,6 +110,9 @@ class Document(object):
         for vertex in data.graph:
             self.vertices[vertex.source] = Vertex(vertex.source, vertex.targets)
 
+    def jump_table(self, end_criteria: Callable[[str], bool]) -> JumpTable:
+        return JumpTable(self.directions, {name: (v.edges[0], v.edges[1]) for name, v in self.vertices.items()}, end_criteria)
+
     def walk(self, start: str, end: str):
         '''
         Walk the graph, following the directions, and repeating as needed.
@@ -51,4 +137,4 @@ class Document(object):
 input_data = '\n'.join(line.rstrip() for line in stdin)
 data = Document(input_data)
 
-print(data.walk('AAA', 'ZZZ'))
+print(data.jump_table(lambda name: name == 'ZZZ').first_end_from('AAA'))
@@ -4,9 +4,11 @@ from collections import defaultdict
 import heapq
 from itertools import chain, cycle
 from functools import reduce
-from sys import stdin
-from typing import List
+from math import gcd, lcm
+from sys import argv, stdin
+from typing import Callable, Dict, FrozenSet, List, Optional, Tuple
 
+import numpy as np
 from pyparsing import alphanums, delimitedList, Group, Keyword, White, Word, ZeroOrMore
 
 directions = Word('LR')
@@ -21,6 +23,195 @@ def print_sometimes(*args, **kwargs):
         print(*args, **kwargs)
     counter += 1
 
+class JumpTable(object):
+    '''
+    An interned form of the graph for fast long walks.
+
+    Node names are interned to integers, and the left and right edges are
+    stored as two lists. For each node we precompute where one full pass of
+    the direction string leaves us, and the first step within that pass (if
+    any) that lands on an end node. Binary lifting over whole passes then
+    answers both "where are we after n steps" and "when do we first reach an
+    end node" in time logarithmic in the number of passes.
+    '''
+    def __init__(self, directions: str, edges: Dict[str, Tuple[str, str]], end_criteria: Callable[[str], bool]):
+        self.names = list(edges.keys())
+        self.index = {name: i for i, name in enumerate(self.names)}
+        self.left = [self.index[edges[name][0]] for name in self.names]
+        self.right = [self.index[edges[name][1]] for name in self.names]
+        self.directions = [self.left if d == 'L' else self.right for d in directions]
+        self.period = len(self.directions)
+        self.is_end = [end_criteria(name) for name in self.names]
+
+        # Destination after one pass, every offset in [0, period) within
+        # that pass that sits on an end node, and the first such offset (or
+        # None)
+        self.pass_destination = []
+        self.end_offsets = []
+        for node in range(len(self.names)):
+            end_offsets = []
+            for offset, table in enumerate(self.directions):
+                if self.is_end[node]:
+                    end_offsets.append(offset)
+                node = table[node]
+            self.pass_destination.append(node)
+            self.end_offsets.append(end_offsets)
+        self.first_end = [offsets[0] if offsets else None for offsets in self.end_offsets]
+
+        # jumps[k][v] is the node reached after 2^k passes from v, and
+        # reaches_end[k][v] is whether an end node is seen at some offset
+        # along the way. Enough levels are kept that any walk must have
+        # entered its cycle of passes, and gone around it, by the last one.
+        self.jumps = [self.pass_destination]
+        self.reaches_end = [[f is not None for f in self.first_end]]
+        self.extend_levels(2 * len(self.names))
+
+    def extend_levels(self, passes: int):
+        '''
+        Add binary lifting levels until a single jump can cover the given
+        number of passes.
+        '''
+        while (1 << len(self.jumps)) <= passes:
+            prev_jumps, prev_reaches = self.jumps[-1], self.reaches_end[-1]
+            self.jumps.append([prev_jumps[prev_jumps[v]] for v in range(len(self.names))])
+            self.reaches_end.append([
+                prev_reaches[v] or prev_reaches[prev_jumps[v]] for v in range(len(self.names))
+            ])
+
+    def position_after(self, start: str, steps: int) -> str:
+        '''
+        Return the node reached after walking the given number of steps.
+        '''
+        node = self.index[start]
+        passes, remainder = divmod(steps, self.period)
+        self.extend_levels(passes)
+        for level in range(passes.bit_length()):
+            if passes & 1 << level:
+                node = self.jumps[level][node]
+        for table in self.directions[:remainder]:
+            node = table[node]
+        return self.names[node]
+
+    def first_end_from(self, start: str) -> int:
+        '''
+        Return the number of steps taken before first standing on an end
+        node, which is zero if we start on one.
+        '''
+        node = self.index[start]
+        passes = 0
+        # Skip as many whole passes as possible without seeing an end node
+        for level in reversed(range(len(self.jumps))):
+            if not self.reaches_end[level][node]:
+                node = self.jumps[level][node]
+                passes += 1 << level
+        if self.first_end[node] is None:
+            raise ValueError(f'No end node reachable from {start}')
+        return passes * self.period + self.first_end[node]
+
+    def ghost_cycle(self, start: str) -> 'GhostCycle':
+        '''
+        Find every step at which a ghost starting from the given node stands
+        on an end node.
+
+        The walk state is (node, instruction index), so at each pass boundary
+        it is fully described by the node alone. Following pass destinations
+        until a node repeats gives the prefix and cycle of the state walk in
+        at most one pass per node.
+        '''
+        node = self.index[start]
+        seen = {}
+        order = []
+        while node not in seen:
+            seen[node] = len(order)
+            order.append(node)
+            node = self.pass_destination[node]
+        prefix_passes = seen[node]
+        cycle_passes = len(order) - prefix_passes
+        hits = [
+            i * self.period + offset
+                for i, v in enumerate(order)
+                for offset in self.end_offsets[v]
+        ]
+        cycle_start = prefix_passes * self.period
+        period = cycle_passes * self.period
+        return GhostCycle(
+            cycle_start,
+            [t for t in hits if t < cycle_start],
+            period,
+            frozenset(t % period for t in hits if t >= cycle_start),
+        )
+
+def crt(r1: int, m1: int, r2: int, m2: int) -> Optional[Tuple[int, int]]:
+    '''
+    Solve t = r1 (mod m1), t = r2 (mod m2) for moduli that need not be
+    coprime.
+
+    Returns (t, lcm(m1, m2)) with 0 <= t < lcm(m1, m2), or None if there is
+    no solution.
+    '''
+    g = gcd(m1, m2)
+    if (r2 - r1) % g:
+        return None
+    modulus = m1 // g * m2
+    # Solve r1 + k * m1 = r2 (mod m2) for k
+    k = (r2 - r1) // g * pow(m1 // g, -1, m2 // g) % (m2 // g)
+    return ((r1 + k * m1) % modulus, modulus)
+
+class GhostCycle(object):
+    '''
+    The set of steps at which a ghost stands on an end node.
+
+    Before cycle_start, these are listed explicitly in prefix_hits. From
+    cycle_start onwards, they are exactly the steps whose remainder modulo
+    period is in residues.
+    '''
+    def __init__(self, cycle_start: int, prefix_hits: List[int], period: int, residues: FrozenSet[int]):
+        self.cycle_start = cycle_start
+        self.prefix_hits = sorted(prefix_hits)
+        self.period = period
+        self.residues = residues
+
+    def __repr__(self):
+        return f'GhostCycle({self.cycle_start}, {self.prefix_hits}, {self.period}, {sorted(self.residues)})'
+
+    def key(self):
+        return (self.cycle_start, tuple(self.prefix_hits), self.period, self.residues)
+
+    def contains(self, step: int) -> bool:
+        if step < self.cycle_start:
+            return step in self.prefix_hits
+        return step % self.period in self.residues
+
+    def combine(self, other: 'GhostCycle') -> 'GhostCycle':
+        '''
+        Return the steps at which both ghosts stand on an end node.
+        '''
+        early, late = sorted((self, other), key=lambda g: g.cycle_start)
+        cycle_start = late.cycle_start
+        # Shared steps before the later cycle starts must be among the later
+        # ghost's explicit prefix hits
+        prefix_hits = [t for t in late.prefix_hits if early.contains(t)]
+        # Afterwards, both ghosts are periodic, so combine every pair of
+        # residues with the generalised CRT
+        residues = set()
+        period = lcm(self.period, other.period)
+        for r1 in self.residues:
+            for r2 in other.residues:
+                solution = crt(r1, self.period, r2, other.period)
+                if solution is not None:
+                    residues.add(solution[0])
+        return GhostCycle(cycle_start, prefix_hits, period, frozenset(residues))
+
+    def first(self) -> int:
+        '''
+        Return the first step in this set.
+        '''
+        if self.prefix_hits:
+            return self.prefix_hits[0]
+        if not self.residues:
+            raise ValueError('No step where every ghost stands on an end node')
+        return min(self.cycle_start + (r - self.cycle_start) % self.period for r in self.residues)
+
 class Document(object):
     def __init__(self, input_data: str):
         data = document.parse_string(input_data, parse_all=True)
@@ -29,6 +220,9 @@ class Document(object):
         for vertex in data.graph:
             self.vertices[vertex.source] = (vertex.targets[0], vertex.targets[1])
 
+    def jump_table(self, end_criteria: Callable[[str], bool]) -> JumpTable:
+        return JumpTable(self.directions, self.vertices, end_criteria)
+
     def walk(self, start, end_criteria):
         '''
         Walk the graph, following the directions, and repeating as needed.
@@ -51,62 +245,55 @@ class Document(object):
         '''
         Walk the graph, following the directions, and repeating as needed.
 
-        Returns the number of steps taken to reach the specified targets.
-        '''
-        # Maintain a cache from each node to the number of new steps required
-        # to reach an end node, and the end node reached.
-        # Note that here we take advantage of a property of the dataset not
-        # guaranteed by the problem statement: the step offset is always 0.
-        # Indexing is node_name -> (steps, end_node)
-        cache = {}
-        cache_stats = [0, 0] # misses, total
-        def walk_from(start):
-            # Walk from the given node at the given step offset until we reach
-            # an end node, taking at least one step, and return the number of
-            # steps taken and the end node reached.
-            #step_offset = step_offset % len(self.directions)
-            cache_stats[1] += 1
-            if start in cache:
-                return cache[start]
-            cache_stats[0] += 1
-            current_name = start
-            for step, d in enumerate(cycle(self.directions)):
-                current = self.vertices[current_name]
-                if d == 'L':
-                    current_name = current[0]
-                elif d == 'R':
-                    current_name = current[1]
-                else:
-                    raise ValueError(f'Unknown direction {d}')
-                if end_criteria(current_name):
-                    result = (step + 1, current_name)
-                    cache[start] = result
-                    return result
-        # Find all starting nodes
-        current_names = [k for k in self.vertices.keys() if start_criteria(k)]
-
-        # Find the first accepting node from each starting node
-        results = [walk_from(start) for start in current_names]
-
-
-        # Note that here we take advantage of a property of the dataset not
-        # guaranteed by the problem statement: the next step for each accepting
-        # node is itself, with the same length as the initial path, meaning
-        # every starting node follows an absurdly simple cycle. This means
-        # we can get away with using the lowest common multiple to find the
-        # solution.
-
-        # ......this is extremely anticlimatic.
-        assert(all((s,n) == walk_from(n) for s,n in results))
-
-        def gcd(a, b):
-            while b:
-                a, b = b, a % b
-            return a
-        # Find the lowest common multiple of all the step counts.
-        lcm = reduce(lambda a, b: a * b // gcd(a, b), (s for s,n in results))
-        print(f'lcm({[s for s,n in results]}) = {lcm}')
-        return lcm
+        Returns the number of steps taken until every ghost stands on a
+        target at the same time.
+
+        This makes no assumptions about the shape of the graph: each ghost
+        may take any path into its cycle, and may pass any number of targets
+        per cycle.
+        '''
+        # Describe each ghost's end node visits as a prefix and a cycle. Many
+        # ghosts typically share a cycle, so only combine distinct ones.
+        table = self.jump_table(end_criteria)
+        ghosts = {}
+        for start in self.vertices.keys():
+            if start_criteria(start):
+                ghost = table.ghost_cycle(start)
+                ghosts[ghost.key()] = ghost
+        if not ghosts:
+            raise ValueError('No starting nodes')
+        return reduce(GhostCycle.combine, ghosts.values()).first()
+
+    def walk_lockstep(self, start_criteria, end_criteria, max_steps: Optional[int] = None) -> int:
+        '''
+        Walk every ghost in lockstep by brute force, and return the number of
+        steps taken until every ghost stands on a target at the same time.
+
+        This makes no use of cycle structure at all. Every ghost's current
+        node is held in one int array, and each step is a single vectorised
+        index into the left or right table, followed by a single check of
+        the end node mask. Steps are run a pass of the directions at a time,
+        checking max_steps between passes.
+        '''
+        # Intern node names, as in JumpTable, but without any per-pass
+        # precomputation
+        names = list(self.vertices.keys())
+        index = {name: i for i, name in enumerate(names)}
+        left = np.array([index[self.vertices[name][0]] for name in names], dtype=np.int32)
+        right = np.array([index[self.vertices[name][1]] for name in names], dtype=np.int32)
+        tables = [left if d == 'L' else right for d in self.directions]
+        is_end = np.array([end_criteria(name) for name in names], dtype=bool)
+        current = np.array([index[name] for name in names if start_criteria(name)], dtype=np.int32)
+        if not len(current):
+            raise ValueError('No starting nodes')
+        step = 0
+        while max_steps is None or step <= max_steps:
+            for t in tables:
+                if is_end[current].all():
+                    return step
+                current = t[current]
+                step += 1
+        raise ValueError(f'Ghosts did not align within {max_steps} steps')
 
 
 
@@ -115,4 +302,7 @@ class Document(object):
 input_data = '\n'.join(line.rstrip() for line in stdin)
 data = Document(input_data)
 
-print(data.walk_all(lambda x: x.endswith('A'), lambda x: x.endswith('Z')))
+if len(argv) > 1 and argv[1] == '--lockstep':
+    print(data.walk_lockstep(lambda x: x.endswith('A'), lambda x: x.endswith('Z')))
+else:
+    print(data.walk_all(lambda x: x.endswith('A'), lambda x: x.endswith('Z')))
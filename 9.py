@@ -5,14 +5,105 @@ import heapq
 from itertools import chain, cycle
 from functools import reduce
 from sys import stdin
-from typing import List
+from typing import Iterable, List
 
+import numpy as np
 from pyparsing import alphanums, delimitedList, Group, Keyword, White, Word, ZeroOrMore
 
 number = Word('-0123456789')
 number_list = Group(delimitedList(number, delim=White(' ')))
 document = ZeroOrMore(number_list)('readings')
 
+def extrapolation_weights(n: int, backwards=False) -> List[int]:
+    '''
+    Return the weights w such that the value after a reading of length n
+    (or before it, if backwards) is sum(w[i] * reading[i]).
+
+    Repeatedly differencing until everything is zero is the same as
+    extrapolating the unique polynomial of degree < n through the reading,
+    which gives signed binomial coefficients:
+
+        after:  (-1)^(n-1-i) * C(n, i)
+        before: (-1)^i * C(n, i + 1)
+    '''
+    # Build C(n, k) for k = 0..n incrementally
+    binomials = [1]
+    for k in range(n):
+        binomials.append(binomials[-1] * (n - k) // (k + 1))
+    if backwards:
+        return [(-1) ** i * binomials[i + 1] for i in range(n)]
+    return [(-1) ** (n - 1 - i) * binomials[i] for i in range(n)]
+
+class SensorPredictor(object):
+    '''
+    Predict values for a single sensor whose readings arrive one at a time.
+
+    Rather than the full difference table, we keep only its last diagonal
+    (the final value, final first difference, and so on) and its first
+    diagonal. Both are trimmed of trailing zeros, so they only hold as many
+    entries as the effective degree of the readings so far.
+
+    Appending a value builds the next last diagonal from the previous one,
+    and predictions in either direction are Newton series over a diagonal,
+    so each costs O(degree).
+    '''
+    def __init__(self, readings: Iterable[int] = ()):
+        self.count = 0
+        self.last = []
+        self.first = []
+        for value in readings:
+            self.append(value)
+
+    def append(self, value: int):
+        '''
+        Add a new reading.
+        '''
+        # Each difference on the new diagonal is the one before it, less the
+        # previous diagonal's difference of the same order
+        diagonal = [value]
+        for prev in self.last:
+            diagonal.append(diagonal[-1] - prev)
+        # Past the stored orders, the previous diagonal is all zeros, so the
+        # highest stored difference repeats up to the new highest order
+        if diagonal[-1] != 0:
+            diagonal.extend([diagonal[-1]] * (self.count + 1 - len(diagonal)))
+        while diagonal and diagonal[-1] == 0:
+            diagonal.pop()
+        self.last = diagonal
+        # The highest order difference is also the newest entry on the first
+        # diagonal
+        order = self.count
+        if order < len(diagonal):
+            self.first.extend([0] * (order - len(self.first)))
+            self.first.append(diagonal[order])
+        self.count += 1
+
+    def predict_next(self, steps=1) -> int:
+        '''
+        Predict the value the given number of steps after the last reading.
+        '''
+        # f(n + k) = sum_j C(k + j - 1, j) * (jth difference at n)
+        total = 0
+        coefficient = 1
+        for j, difference in enumerate(self.last):
+            if j:
+                coefficient = coefficient * (steps + j - 1) // j
+            total += coefficient * difference
+        return total
+
+    def predict_previous(self, steps=1) -> int:
+        '''
+        Predict the value the given number of steps before the first reading.
+        '''
+        # f(-k) = sum_j (-1)^j C(k + j - 1, j) * (jth difference at 0)
+        total = 0
+        coefficient = 1
+        for j, difference in enumerate(self.first):
+            if j:
+                coefficient = coefficient * (steps + j - 1) // j
+            total += (-1) ** j * coefficient * difference
+        return total
+
 class Document(object):
     def __init__(self, input_data: str):
         data = document.parse_string(input_data, parse_all=True)
@@ -34,8 +125,31 @@ class Document(object):
         #print(f'{seq}: {predicted_diff + seq[-1]}')
         return predicted_diff + seq[-1]
 
+    def predict_all(self, backwards=False) -> List[int]:
+        '''
+        Predict the next (or previous) value of every reading at once.
+
+        If every reading has the same length, this is a single matrix-vector
+        product with the extrapolation weights, falling back to exact Python
+        ints if int64 could overflow. Otherwise, each reading is weighted in
+        O(n) with weights shared between readings of the same length.
+        '''
+        if not self.readings:
+            return []
+        lengths = set(len(r) for r in self.readings)
+        if len(lengths) == 1:
+            n = lengths.pop()
+            weights = extrapolation_weights(n, backwards)
+            largest = max(abs(v) for r in self.readings for v in r)
+            # Each term and the sum of n of them must fit in an int64
+            dtype = np.int64 if largest * max(abs(w) for w in weights) * n < 2 ** 63 else object
+            predictions = np.array(self.readings, dtype=dtype) @ np.array(weights, dtype=dtype)
+            return [int(v) for v in predictions]
+        weights = {n: extrapolation_weights(n, backwards) for n in lengths}
+        return [sum(w * v for w, v in zip(weights[len(r)], r)) for r in self.readings]
+
 input_data = '\n'.join(line.rstrip() for line in stdin)
 data = Document(input_data)
 
 # Print the sum of all the predicted next values
-print(sum(data.predict_next(r) for r in data.readings))
+print(sum(data.predict_all()))